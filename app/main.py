@@ -5,15 +5,23 @@ CIL Router - 极简版 Claude API 转发器
 """
 
 from fastapi import FastAPI, Request, HTTPException
-from fastapi.responses import Response, StreamingResponse
+from fastapi.responses import Response, StreamingResponse, JSONResponse, ORJSONResponse
 import httpx
+from httpx._utils import get_environment_proxies
 import sys
 import os
-from urllib.parse import urlsplit
 import json
 import time
 import asyncio
+import hmac
+import socket
 import random
+import queue
+import atexit
+import threading
+import functools
+from contextlib import asynccontextmanager
+from typing import Optional
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import config.config as config
@@ -23,9 +31,39 @@ from app.utils.logger import init_logger, get_logger
 # 一行式控制台开关（默认开启，可用环境变量关闭）
 CONSOLE_BRIEF = os.getenv("CIL_CONSOLE_BRIEF", "1") == "1"
 
+# 简报行由后台线程批量写出，请求路径上只做入队，避免每行 flush 阻塞事件循环
+_brief_queue: "queue.SimpleQueue[str]" = queue.SimpleQueue()
+
+def _drain_brief_queue(block: bool) -> None:
+    """取出积压的简报行并一次性写出"""
+    lines = []
+    try:
+        if block:
+            lines.append(_brief_queue.get())
+        while True:
+            lines.append(_brief_queue.get_nowait())
+    except queue.Empty:
+        pass
+    if lines:
+        sys.stdout.write("\n".join(lines) + "\n")
+        sys.stdout.flush()
+
+def _brief_writer():
+    while True:
+        try:
+            _drain_brief_queue(block=True)
+        except Exception:
+            # 输出失败（如stdout已关闭）不影响后续简报
+            pass
+
+if CONSOLE_BRIEF:
+    threading.Thread(target=_brief_writer, name="cil-brief-writer", daemon=True).start()
+    # 进程退出前写出剩余的简报行
+    atexit.register(_drain_brief_queue, False)
+
 def _brief(msg: str):
     if CONSOLE_BRIEF:
-        print(msg, flush=True)
+        _brief_queue.put(msg)
 
 # 可重试的状态码（按实际需要再调）
 _RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504,520, 521, 522, 523, 524}
@@ -33,22 +71,146 @@ _RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504,520, 521, 522, 523,
 def _is_retryable_status(code: int) -> bool:
     return code in _RETRYABLE_STATUS
 
+# 可重试的异常类型（模块级元组，避免每次判断时重新构建）
+_RETRYABLE_EXC = (
+    httpx.ConnectError,
+    httpx.ReadTimeout,
+    httpx.WriteError,
+    httpx.WriteTimeout,
+    httpx.RemoteProtocolError,
+    httpx.TimeoutException,  # 兜底
+)
+
 def _is_retryable_exc(e: Exception) -> bool:
-    return isinstance(e, (
-        httpx.ConnectError,
-        httpx.ReadTimeout,
-        httpx.WriteError,
-        httpx.WriteTimeout,
-        httpx.PoolTimeout,
-        httpx.RemoteProtocolError,
-        httpx.TimeoutException,  # 兜底
-    ))
+    # 连接池等待超时说明本地已饱和，重试只会加剧拥塞，直接失败
+    if isinstance(e, httpx.PoolTimeout):
+        return False
+    return isinstance(e, _RETRYABLE_EXC)
 
 async def _sleep_backoff(attempt: int):
-    # 指数回退 + 抖动（最多2s）
+    # 指数回退 + 去相关抖动（在 [base, 3*base] 内随机，最多2s），避免并发请求同时重试
     base = 0.25 * (2 ** (attempt - 1))
-    jitter = random.uniform(0, 0.25)
-    await asyncio.sleep(min(base + jitter, 2.0))
+    await asyncio.sleep(min(random.uniform(base, base * 3), 2.0))
+
+# 转发时需剔除的请求头：逐跳头、认证类头部（防止冲突）以及由我们统一设置的accept-encoding
+_STRIPPED_REQUEST_HEADERS = frozenset({
+    b'host', b'content-length', b'transfer-encoding', b'connection', b'keep-alive',
+    b'proxy-connection', b'te', b'trailer', b'upgrade', b'expect',
+    b'authorization', b'x-api-key', b'api-key', b'x-authorization', b'proxy-authorization',
+    b'accept-encoding',
+})
+
+def _filter_raw_headers(scope_headers) -> list:
+    """
+    过滤ASGI原始请求头列表（头名已是小写bytes），返回新的列表
+    """
+    return [(k, v) for k, v in scope_headers if k not in _STRIPPED_REQUEST_HEADERS]
+
+# 不透传给客户端的上游响应头（小写bytes）：逐跳头、由Starlette按实际响应体重新计算的content-length，
+# 以及由我们统一设置的CORS头（保留 content-encoding，响应体未解压）
+_STRIPPED_RESPONSE_HEADERS = frozenset({
+    b'transfer-encoding', b'content-length', b'connection', b'keep-alive',
+    b'proxy-connection', b'te', b'trailer', b'upgrade', b'access-control-allow-origin',
+})
+
+def _filter_response_headers(raw_headers) -> list:
+    """
+    过滤上游响应的原始头列表，返回可直接用作ASGI响应头的 (小写bytes, bytes) 列表
+    """
+    filtered = []
+    for k, v in raw_headers:
+        # ASGI要求头名小写，HTTP/1.1上游可能保留原始大小写
+        k = k.lower()
+        if k not in _STRIPPED_RESPONSE_HEADERS:
+            filtered.append((k, v))
+    return filtered
+
+# httpx 的 HTTP/2 支持依赖可选的 h2 包（httpx[http2]），未安装时回退到 HTTP/1.1
+try:
+    import h2  # noqa: F401
+    _HTTP2_ENABLED = True
+except ImportError:
+    _HTTP2_ENABLED = False
+
+# 自身JSON接口（/、/providers、/select）优先用 orjson 序列化，未安装时回退到标准库json
+try:
+    import orjson  # noqa: F401
+    _DEFAULT_RESPONSE_CLASS = ORJSONResponse
+except ImportError:
+    _DEFAULT_RESPONSE_CLASS = JSONResponse
+
+# 上游连接池限制
+_UPSTREAM_LIMITS = httpx.Limits(max_connections=200, max_keepalive_connections=100, keepalive_expiry=60)
+
+
+@functools.lru_cache(maxsize=8)
+def _upstream_timeout(seconds: float) -> httpx.Timeout:
+    """按超时秒数复用 httpx.Timeout 对象（配置值基本不变，不必每个请求重新构造）"""
+    return httpx.Timeout(seconds)
+
+# 上游套接字选项：关闭Nagle算法避免SSE逐token转发时的延迟抖动，并增大接收缓冲区
+_UPSTREAM_SOCKET_OPTIONS = [
+    (socket.IPPROTO_TCP, socket.TCP_NODELAY, 1),
+    (socket.SOL_SOCKET, socket.SO_RCVBUF, 262144),
+]
+
+# 上游客户端：{base_url: AsyncClient}，复用连接池，启用HTTP/2时同一连接可多路复用。
+# 服务启动时（lifespan）为所有已配置的 base_url 创建并挂在 app.state 上，关闭时统一释放；
+# 连接池绑定事件循环，只有在 lifespan 所在的事件循环上才复用这些客户端
+
+def _new_upstream_transport(proxy: Optional[httpx.Proxy] = None) -> httpx.AsyncHTTPTransport:
+    """创建带连接池限制和套接字选项的上游传输层"""
+    return httpx.AsyncHTTPTransport(
+        http2=_HTTP2_ENABLED, limits=_UPSTREAM_LIMITS, socket_options=_UPSTREAM_SOCKET_OPTIONS, proxy=proxy
+    )
+
+def _new_upstream_client(base_url: str) -> httpx.AsyncClient:
+    """创建上游客户端，请求时只需传相对路径，由客户端基于 base_url 解析"""
+    # 显式传入 transport 后 httpx 不再读取代理环境变量，这里按 HTTP_PROXY/HTTPS_PROXY/ALL_PROXY/NO_PROXY
+    # 自行挂载代理传输层（NO_PROXY 对应 None，即走默认传输层），与 httpx 默认的 trust_env 行为一致
+    mounts = {
+        pattern: None if proxy_url is None else _new_upstream_transport(httpx.Proxy(proxy_url))
+        for pattern, proxy_url in get_environment_proxies().items()
+    }
+    return httpx.AsyncClient(base_url=base_url, transport=_new_upstream_transport(), mounts=mounts)
+
+@asynccontextmanager
+async def _upstream_client(base_url: str):
+    """
+    获取指定 base_url 的上游客户端
+    在 lifespan 的事件循环上复用 app.state 中的客户端（运行时重载新增的端点首次使用时补建，同样在关闭时释放）；
+    其他事件循环（如未以 with 方式使用的测试客户端）没有人负责释放连接池，改用本次请求独占的临时客户端，用完即关闭
+    """
+    state = app.state
+    if getattr(state, "upstream_loop", None) is asyncio.get_running_loop():
+        clients = state.upstream_clients
+        client = clients.get(base_url)
+        if client is None or client.is_closed:
+            client = clients[base_url] = _new_upstream_client(base_url)
+        yield client
+    else:
+        async with _new_upstream_client(base_url) as client:
+            yield client
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期：启动时为每个已配置的 base_url 创建上游客户端，关闭时释放连接池"""
+    clients = {}
+    for provider_info in config.get_all_providers_info():
+        for base_url in provider_info["base_urls"]:
+            # 与端点快照一致去掉末尾的 "/"（只在启动时做一次，请求路径上的 base_url 已由快照去好）
+            base_url = base_url.rstrip('/')
+            if base_url not in clients:
+                clients[base_url] = _new_upstream_client(base_url)
+    app.state.upstream_clients = clients
+    app.state.upstream_loop = asyncio.get_running_loop()
+    try:
+        yield
+    finally:
+        if app.state.upstream_clients is clients:
+            app.state.upstream_loop = None
+        for client in clients.values():
+            await client.aclose()
 
 class RetryableStreamError(Exception):
     def __init__(self, status_code: int, detail: str = ""):
@@ -57,7 +219,8 @@ class RetryableStreamError(Exception):
         super().__init__(f"Retryable stream error {status_code}: {detail}")
 
 # 创建 FastAPI 应用
-app = FastAPI(title="CIL Router", version="1.0.2")
+app = FastAPI(title="CIL Router", version="1.0.2", lifespan=lifespan,
+              default_response_class=_DEFAULT_RESPONSE_CLASS)
 
 # 初始化日志系统
 log_config = config.get_log_config()
@@ -65,20 +228,20 @@ init_logger(log_level=log_config["level"], log_dir=log_config["dir"])
 
 # 初始化限流器
 rate_limiter = None
-if config.is_rate_limit_enabled():
-    rate_limit_config = config.get_rate_limit_config()
+rate_limit_config = config.get_rate_limit_config()
+ip_block_config = config.get_ip_block_config()
+if rate_limit_config["enabled"]:
     rate_limiter = RateLimiter(
         requests_per_minute=rate_limit_config["requests_per_minute"],
         burst_size=rate_limit_config["burst_size"]
     )
-    # 获取IP阻止配置
-    ip_block_config = config.get_ip_block_config()
-    
-    # 添加限流中间件
+
+# 限流和IP阻止都未启用时不挂载中间件，请求链路上少一层中间件调用
+if rate_limit_config["enabled"] or ip_block_config["enabled"]:
     app.add_middleware(
         RateLimitMiddleware,
         rate_limiter=rate_limiter,
-        enabled=True,
+        enabled=rate_limit_config["enabled"],
         trust_proxy=rate_limit_config["trust_proxy"],
         ip_block_enabled=ip_block_config["enabled"],
         blocked_ips_file=ip_block_config["blocked_ips_file"]
@@ -197,19 +360,17 @@ async def forward_request(path: str, request: Request):
         if body and logger:
             logger.log_request_body(body)
         
-        # 鉴权检查：如果启用了鉴权，验证Authorization头部
-        if config.is_auth_enabled():
-            auth_header = request.headers.get('authorization', '')
-            if not auth_header.startswith('Bearer '):
-                if logger:
-                    logger.warning("鉴权失败：缺少Bearer token")
-                # 静默拒绝的最接近做法：空体+403
-                return Response(status_code=403, content=b"")
-
-            provided_key = auth_header[7:]  # 移除 'Bearer ' 前缀
-            if provided_key != config.get_auth_key():
+        # 鉴权检查：如果启用了鉴权，以常量时间比较预先计算好的Authorization头部
+        expected_auth = config.expected_auth_header
+        if expected_auth is not None:
+            # Starlette 以 latin-1 解码头部，这里编码回原始字节
+            auth_header = request.headers.get('authorization', '').encode('latin-1')
+            if not hmac.compare_digest(auth_header, expected_auth):
                 if logger:
-                    logger.warning("鉴权失败：token无效")
+                    if not auth_header.startswith(b'Bearer '):
+                        logger.warning("鉴权失败：缺少Bearer token")
+                    else:
+                        logger.warning("鉴权失败：token无效")
                 # 静默拒绝的最接近做法：空体+403
                 return Response(status_code=403, content=b"")
         # 获取当前供应商配置（使用负载均衡）
@@ -219,52 +380,32 @@ async def forward_request(path: str, request: Request):
                 logger.error("供应商配置不完整")
             raise HTTPException(status_code=503, detail="供应商配置不完整")
 
-        # 原始请求头拷贝并清洗
-        headers = dict(request.headers)
-
-        # 强制上游不压缩，避免解压错位问题（处理大小写重复键）
-        for k in ('accept-encoding', 'Accept-Encoding'):
-            headers.pop(k, None)
-        headers['Accept-Encoding'] = 'identity'
-
-        # 移除逐跳头（hop-by-hop headers）
-        hop_by_hop_headers = [
-            'host', 'content-length', 'transfer-encoding', 'connection', 'keep-alive',
-            'proxy-connection', 'te', 'trailer', 'upgrade', 'expect'
-        ]
-        for hk in hop_by_hop_headers:
-            headers.pop(hk, None)
-            headers.pop(hk.title(), None)
-
-        # 清洗认证类头部，防止冲突
-        auth_headers = [
-            'authorization', 'Authorization', 'x-api-key', 'X-Api-Key', 
-            'api-key', 'Api-Key', 'x-authorization', 'X-Authorization',
-            'proxy-authorization', 'Proxy-Authorization'
-        ]
-        for hk in auth_headers:
-            headers.pop(hk, None)
-        
+        # 检查是否为流式请求
+        is_streaming = _is_streaming_request(request.headers, body if body else b"")
+
+        # 直接基于ASGI原始头列表（小写bytes）清洗，避免整表解码成dict
+        raw_headers = _filter_raw_headers(request.scope["headers"])
+        # 普通请求沿用客户端声明的 accept-encoding，上游压缩后的响应体原样透传给客户端；
+        # 流式响应头在连上游之前就已确定，无法带上 content-encoding，因此仍要求上游不压缩
+        accept_encoding = None if is_streaming else request.headers.get("accept-encoding")
+        raw_headers.append((b"accept-encoding", accept_encoding.encode("latin-1") if accept_encoding else b"identity"))
         # 统一注入我们的认证
-        headers["Authorization"] = f"Bearer {provider['api_key']}"
+        raw_headers.append((b"authorization", provider["auth_header"]))
+        headers = httpx.Headers(raw_headers)
 
-        # 目标URL（保留原 query）
-        base_url = provider['base_url'].rstrip('/')
-        # 用urlsplit拼原path+query
-        split_req = urlsplit(str(request.url))
-        target_url = f"{base_url}/{path}"
-        if split_req.query:
-            target_url = f"{target_url}?{split_req.query}"
-
-        # 检查是否为流式请求
-        is_streaming = _is_streaming_request(headers, body if body else b"")
+        # 目标路径（相对 base_url，保留原始 query），由上游客户端拼接 base_url
+        base_url = provider['base_url']
+        target_url = "/" + path
+        query_string = request.scope["query_string"]
+        if query_string:
+            target_url += "?" + query_string.decode("latin-1")
 
         if is_streaming:
             # 处理流式请求（支持失败重试）
-            return await _handle_streaming_request_with_retry(method, target_url, headers, request, body)
+            return await _handle_streaming_request_with_retry(method, target_url, headers, request, body, base_url)
         else:
             # 处理普通请求（支持失败重试）
-            return await _handle_normal_request_with_retry(method, target_url, headers, request, body)
+            return await _handle_normal_request_with_retry(method, target_url, headers, request, body, base_url)
 
     except httpx.HTTPError as e:
         if logger:
@@ -276,6 +417,9 @@ async def forward_request(path: str, request: Request):
         raise HTTPException(status_code=500, detail=f"内部错误: {str(e)}")
 
 
+# JSON 空白字符（单字节切片形式，便于在bytes上逐个比较）
+_JSON_WHITESPACE = (b' ', b'\t', b'\r', b'\n')
+
 def _is_streaming_request(headers: dict, body: bytes) -> bool:
     """
     判断是否为流式请求
@@ -286,20 +430,27 @@ def _is_streaming_request(headers: dict, body: bytes) -> bool:
     if 'text/event-stream' in accept or 'application/stream' in accept:
         return True
 
-    # 检查请求体中是否有stream参数
+    # 检查请求体中是否有stream参数（直接在bytes上查找，避免整体解码和复制请求体）
     if body:
-        try:
-            body_str = body.decode('utf-8', errors='ignore')
-            if '"stream"' in body_str and '"stream":true' in body_str.replace(' ', ''):
-                return True
-        except:
-            pass
+        pos = body.find(b'"stream"')
+        while pos != -1:
+            i = pos + 8
+            while body[i:i + 1] in _JSON_WHITESPACE:
+                i += 1
+            if body[i:i + 1] == b':':
+                i += 1
+                while body[i:i + 1] in _JSON_WHITESPACE:
+                    i += 1
+                if body.startswith(b'true', i):
+                    return True
+            pos = body.find(b'"stream"', pos + 8)
 
     return False
 
 
-async def _handle_normal_request_with_retry(method: str, original_target_url: str, headers: dict,
-                                            request: Request, body: bytes = None) -> Response:
+async def _handle_normal_request_with_retry(method: str, target_url: str, headers: dict,
+                                            request: Request, body: bytes = None,
+                                            base_url: str = "") -> Response:
     """
     处理普通（非流式）请求，支持失败重试：
     - 网络/超时类异常：重试
@@ -323,19 +474,14 @@ async def _handle_normal_request_with_retry(method: str, original_target_url: st
                 if not provider["base_url"] or not provider["api_key"]:
                     _brief(f"[SKIP] provider config incomplete on attempt {attempt}/{max_retries}")
                     continue
-                headers["Authorization"] = f"Bearer {provider['api_key']}"
-                split_orig = urlsplit(original_target_url)
-                base_url = provider['base_url'].rstrip('/')
-                target_url = f"{base_url}{split_orig.path}"
-                if split_orig.query:
-                    target_url = f"{target_url}?{split_orig.query}"
-            else:
-                target_url = original_target_url
+                headers["Authorization"] = provider["auth_header"].decode()
+                # 目标路径不变，只切换 base_url 对应的上游客户端
+                base_url = provider['base_url']
 
             t0 = time.perf_counter()
-            _brief(f"[TRY {attempt}/{max_retries}] {method} {target_url}")
+            _brief(f"[TRY {attempt}/{max_retries}] {method} {base_url}{target_url}")
 
-            resp = await _handle_normal_request(method, target_url, headers, body, attempt)
+            resp = await _handle_normal_request(method, target_url, headers, body, attempt, base_url)
             dt = (time.perf_counter() - t0) * 1000.0
             last_status = resp.status_code
             _brief(f"[RESP {attempt}/{max_retries}] {resp.status_code} in {dt:.1f}ms")
@@ -366,7 +512,7 @@ async def _handle_normal_request_with_retry(method: str, original_target_url: st
 
 
 async def _handle_normal_request(method: str, target_url: str, headers: dict, body: bytes = None,
-                                 attempt: int = 1) -> Response:
+                                 attempt: int = 1, base_url: str = "") -> Response:
     """
     处理普通（非流式）请求
     """
@@ -374,78 +520,75 @@ async def _handle_normal_request(method: str, target_url: str, headers: dict, bo
     
     # 记录转发请求
     if logger:
-        logger.log_forward_request(method, target_url, headers, body, attempt)
+        logger.log_forward_request(method, base_url + target_url, headers, body, attempt)
     else:
         # 如果没有日志，使用原来的控制台输出
         retry_info = f" (重试 {attempt})" if attempt > 1 else ""
-        print(f"🔄 转发请求{retry_info}: {method} {target_url}")
+        print(f"🔄 转发请求{retry_info}: {method} {base_url}{target_url}")
         if attempt == 1:  # 只在第一次尝试时显示详细头部信息
             print(f"📤 请求头: {dict((k, v[:50] + '...' if len(v) > 50 else v) for k, v in headers.items())}")
         if body:
             body_preview = body.decode('utf-8', errors='ignore')[:200] + ('...' if len(body) > 200 else '')
             print(f"📤 请求体预览: {body_preview}")
 
-    # 发送请求
+    # 发送请求（以流方式读取原始字节，不解压，上游的 content-encoding 原样透传）
     t0 = time.perf_counter()
-    async with httpx.AsyncClient(timeout=httpx.Timeout(config.get_request_timeout())) as client:
-        response = await client.request(
+    async with _upstream_client(base_url) as client:
+        upstream_request = client.build_request(
             method=method,
             url=target_url,
             headers=headers,
-            content=body
+            content=body,
+            timeout=_upstream_timeout(config.get_request_timeout())
         )
+        response = await client.send(upstream_request, stream=True)
+        try:
+            response_body = b"".join([chunk async for chunk in response.aiter_raw()])
+        finally:
+            await response.aclose()
 
-        # 记录转发响应
-        if logger:
-            logger.log_forward_response(response.status_code, dict(response.headers), response.content)
-        else:
-            # 如果没有日志，使用原来的控制台输出
-            print(f"📥 响应状态: {response.status_code}")
-            print(f"📥 响应头: {dict(response.headers)}")
-            
-            # 如果不是200，记录错误详情
-            if response.status_code != 200:
-                error_content = response.text[:500] + ('...' if len(response.text) > 500 else '')
-                print(f"❌ 错误响应内容: {error_content}")
-            else:
-                success_preview = response.text[:200] + ('...' if len(response.text) > 200 else '')
-                print(f"✅ 成功响应预览: {success_preview}")
-        
-        # 无论是否有logger，都打一行简报
-        _brief(f"[PASS] {method} {target_url} -> {response.status_code} in {(time.perf_counter()-t0)*1000:.1f}ms")
-
-        # 复制响应头部
-        response_headers = dict(response.headers)
-
-        # 移除逐跳头和可能导致问题的响应头部
-        response_hop_headers = [
-            'content-encoding', 'transfer-encoding', 'content-length', 
-            'connection', 'keep-alive', 'proxy-connection', 'te', 'trailer', 'upgrade'
-        ]
-        for hk in response_hop_headers:
-            response_headers.pop(hk, None)
-
-        # 添加CORS头
-        response_headers["Access-Control-Allow-Origin"] = "*"
-        
-        # 记录响应信息，处理media_type大小写问题
-        content_type = response.headers.get("content-type") or response_headers.get("content-type")
-        final_response = Response(
-            content=(b"" if method == "HEAD" else response.content),  # HEAD方法不携带响应体
-            status_code=response.status_code,
-            headers=response_headers,
-            media_type=content_type
-        )
-        
-        if logger:
-            logger.log_response(final_response, response.content)
+    # 记录转发响应
+    if logger:
+        logger.log_forward_response(response.status_code, response.headers, response_body)
+    else:
+        # 如果没有日志，使用原来的控制台输出
+        print(f"📥 响应状态: {response.status_code}")
+        print(f"📥 响应头: {dict(response.headers.items())}")
         
-        # 返回完全相同的响应
-        return final_response
+        # 如果不是200，记录错误详情；压缩的响应体原样透传，无法直接预览，只打印占位
+        if response.headers.get("content-encoding"):
+            response_text = f"<compressed {len(response_body)} bytes>"
+        else:
+            response_text = response_body.decode('utf-8', errors='ignore')
+        if response.status_code != 200:
+            error_content = response_text[:500] + ('...' if len(response_text) > 500 else '')
+            print(f"❌ 错误响应内容: {error_content}")
+        else:
+            success_preview = response_text[:200] + ('...' if len(response_text) > 200 else '')
+            print(f"✅ 成功响应预览: {success_preview}")
+    
+    # 无论是否有logger，都打一行简报
+    _brief(f"[PASS] {method} {base_url}{target_url} -> {response.status_code} in {(time.perf_counter()-t0)*1000:.1f}ms")
+
+    # 不指定media_type，由Starlette只生成content-length；其余响应头（含content-type）直接沿用上游原始头列表
+    final_response = Response(
+        content=(b"" if method == "HEAD" else response_body),  # HEAD方法不携带响应体
+        status_code=response.status_code,
+    )
+    final_response.raw_headers.extend(_filter_response_headers(response.headers.raw))
+    # 添加CORS头
+    final_response.raw_headers.append((b"access-control-allow-origin", b"*"))
+    
+    if logger:
+        logger.log_response(final_response, response_body)
+    
+    # 返回完全相同的响应
+    return final_response
 
 
-async def _handle_streaming_request_with_retry(method: str, original_target_url: str, headers: dict,
-                                               request: Request, body: bytes = None) -> StreamingResponse:
+async def _handle_streaming_request_with_retry(method: str, target_url: str, headers: dict,
+                                               request: Request, body: bytes = None,
+                                               base_url: str = "") -> StreamingResponse:
     """
     处理流式请求，支持失败重试（仅对"打开流时"的错误/状态码生效）。
     已经开始向客户端写入后再出错，无法再无缝重试。
@@ -461,17 +604,12 @@ async def _handle_streaming_request_with_retry(method: str, original_target_url:
                 if not provider["base_url"] or not provider["api_key"]:
                     _brief(f"[SKIP] provider config incomplete on attempt {attempt}/{max_retries} (stream)")
                     continue
-                headers["Authorization"] = f"Bearer {provider['api_key']}"
-                split_orig = urlsplit(original_target_url)
-                base_url = provider['base_url'].rstrip('/')
-                target_url = f"{base_url}{split_orig.path}"
-                if split_orig.query:
-                    target_url = f"{target_url}?{split_orig.query}"
-            else:
-                target_url = original_target_url
-
-            _brief(f"[TRY {attempt}/{max_retries}] (stream) {method} {target_url}")
-            sr = await _handle_streaming_request(method, target_url, headers, body, attempt)
+                headers["Authorization"] = provider["auth_header"].decode()
+                # 目标路径不变，只切换 base_url 对应的上游客户端
+                base_url = provider['base_url']
+
+            _brief(f"[TRY {attempt}/{max_retries}] (stream) {method} {base_url}{target_url}")
+            sr = await _handle_streaming_request(method, target_url, headers, body, attempt, base_url)
             _brief(f"[RESP {attempt}/{max_retries}] (stream) opened")
             return sr
 
@@ -507,32 +645,33 @@ async def _handle_streaming_request_with_retry(method: str, original_target_url:
 
 
 async def _handle_streaming_request(method: str, target_url: str, headers: dict, body: bytes = None,
-                                   attempt: int = 1) -> StreamingResponse:
+                                   attempt: int = 1, base_url: str = "") -> StreamingResponse:
     """
     处理流式请求
     """
     logger = get_logger()
     
     if logger:
-        logger.log_forward_request(method, target_url, headers, body, attempt)
+        logger.log_forward_request(method, base_url + target_url, headers, body, attempt)
     else:
-        _brief(f"[FORWARD(stream){'' if attempt==1 else f' retry#{attempt}'}] {method} {target_url}")
+        _brief(f"[FORWARD(stream){'' if attempt==1 else f' retry#{attempt}'}] {method} {base_url}{target_url}")
 
     async def stream_generator():
         """
         流式响应生成器
         """
         try:
-            async with httpx.AsyncClient(timeout=httpx.Timeout(config.get_stream_timeout())) as client:
+            async with _upstream_client(base_url) as client:
                 async with client.stream(
                         method=method,
                         url=target_url,
                         headers=headers,
-                        content=body
+                        content=body,
+                        timeout=_upstream_timeout(config.get_stream_timeout())
                 ) as response:
                     # 记录流式响应开始
                     if logger:
-                        logger.log_forward_response(response.status_code, dict(response.headers))
+                        logger.log_forward_response(response.status_code, response.headers)
                     
                     # 打开时就返回错误：可判定是否可重试
                     if response.status_code >= 400:
@@ -547,10 +686,9 @@ async def _handle_streaming_request(method: str, target_url: str, headers: dict,
                             yield f"data: {json.dumps(msg, ensure_ascii=False)}\n\n".encode()
                             return
                     
-                    # 流式传输响应内容
-                    async for chunk in response.aiter_bytes():
-                        if chunk:
-                            yield chunk
+                    # 流式传输响应内容：直接透传原始字节，跳过解码层（已要求上游不压缩，httpx也不会产出空块）
+                    async for chunk in response.aiter_raw():
+                        yield chunk
         except RetryableStreamError:
             # 直接向上抛，让上层决定是否重试
             raise
@@ -586,4 +724,5 @@ if __name__ == "__main__":
     print(f"🚀 启动 CIL Router 在 {server_config['host']}:{server_config['port']}")
     print(f"📡 配置了 {config.get_provider_count()} 个供应商")
     print(f"🎯 当前使用供应商 {config.current_provider_index}")
-    uvicorn.run(app, host=server_config['host'], port=server_config['port'],access_log=False)
\ No newline at end of file
+    # 使用基于C解析器的httptools解析下游请求（由 uvicorn[standard] 提供）
+    uvicorn.run(app, host=server_config['host'], port=server_config['port'], http="httptools", access_log=False)
\ No newline at end of file
@@ -6,21 +6,50 @@
 
 import json
 import time
+import logging
 import asyncio
-from typing import Dict, Optional, List
+import functools
+import ipaddress
+from collections import OrderedDict
+from typing import Dict, Optional, List, Tuple, FrozenSet
 from dataclasses import dataclass
 from pathlib import Path
-from fastapi import Request, HTTPException
-from starlette.middleware.base import BaseHTTPMiddleware
+from fastapi import Request
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.utils.logger import get_logger
 
+# 中间件自身的诊断信息走标准 logging（挂在 cilrouter 日志器下，启用文件日志时一并写入），
+# 不再用 print 同步写 stdout 阻塞事件循环
+_log = logging.getLogger("cilrouter.rate_limiter")
 
-@dataclass
+# 阻止IP文件的事件驱动热重载依赖可选的 watchfiles（uvicorn[standard] 自带），未安装时回退到定期检查文件修改时间
+try:
+    import watchfiles
+except ImportError:
+    watchfiles = None
+
+# 429 响应体优先用 orjson 序列化，未安装时回退到标准库json
+try:
+    import orjson  # noqa: F401
+    from fastapi.responses import ORJSONResponse as _RejectionResponse
+except ImportError:
+    from starlette.responses import JSONResponse as _RejectionResponse
+
+# 令牌桶使用单调时钟（不受系统时间调整影响）；绑定为模块级名称，省去热路径上的属性查找
+_now = time.monotonic
+
+# 超过该时长未活动的bucket视为过期（等价于已补满），访问时直接重建
+BUCKET_IDLE_SECONDS = 600
+# bucket数量上限，超出时按最近最少使用淘汰
+MAX_BUCKETS = 100_000
+
+
+@dataclass(slots=True)
 class TokenBucket:
-    """令牌桶数据结构"""
+    """令牌桶数据结构（只保存可变状态，容量与补充速率由所属 RateLimiter 统一提供）"""
     tokens: float          # 当前令牌数量
-    capacity: int          # 桶容量（最大令牌数）
-    refill_rate: float     # 令牌补充速率（每秒）
-    last_refill: float     # 上次补充时间
+    last_refill: float     # 上次补充时间（time.monotonic()）
 
 
 class RateLimiter:
@@ -42,177 +71,163 @@ class RateLimiter:
         
         self.requests_per_minute = requests_per_minute
         self.burst_size = burst_size
+        # 令牌上限的浮点形式：补充时直接与之比较截断，令牌数始终保持 float，不会在 int/float 间来回切换
+        self._capacity = float(burst_size)
         self.refill_rate = requests_per_minute / 60.0  # 每秒补充的令牌数
-        self.buckets: Dict[str, TokenBucket] = {}
-        self._lock = asyncio.Lock()
-        
-        # 清理过期bucket的任务
-        self._cleanup_task = None
-        # 延迟启动清理任务，等到有事件循环时再启动
-    
-    def _start_cleanup_task(self):
-        """启动清理任务"""
-        if self._cleanup_task is None or self._cleanup_task.done():
-            self._cleanup_task = asyncio.create_task(self._cleanup_expired_buckets())
-    
-    def _sync_cleanup_if_needed(self):
-        """同步清理过期bucket（兜底机制）"""
-        try:
-            now = time.time()
-            expired_keys = []
-            
-            # 不使用异步锁，直接操作
-            for key, bucket in list(self.buckets.items()):
-                if now - bucket.last_refill > 600:  # 10分钟未使用
-                    expired_keys.append(key)
-            
-            for key in expired_keys:
-                self.buckets.pop(key, None)
-            
-            if expired_keys:
-                print(f"🧹 同步清理了 {len(expired_keys)} 个过期的限流bucket")
-        except Exception as e:
-            print(f"❌ 同步清理bucket时出错: {e}")
-                    
-    async def _cleanup_expired_buckets(self):
-        """定期清理长时间未使用的bucket"""
-        while True:
-            try:
-                await asyncio.sleep(300)  # 每5分钟清理一次
-                now = time.time()
-                expired_keys = []
-                
-                async with self._lock:
-                    for key, bucket in self.buckets.items():
-                        # 如果bucket 10分钟没有活动，则清理
-                        if now - bucket.last_refill > 600:
-                            expired_keys.append(key)
-                    
-                    for key in expired_keys:
-                        del self.buckets[key]
-                
-                if expired_keys:
-                    print(f"🧹 清理了 {len(expired_keys)} 个过期的限流bucket")
-                    
-            except asyncio.CancelledError:
-                break
-            except Exception as e:
-                print(f"❌ 清理expired buckets时出错: {e}")
+        # 运行期间不变的响应头取值，预先算好，避免每个请求重复 int()/str()
+        self._retry_after_seconds = int(60 / requests_per_minute) + 1
+        self._retry_after_str = str(self._retry_after_seconds)
+        self._rpm_str = str(requests_per_minute)
+        self._rpm_bytes = self._rpm_str.encode()
+        # 按访问顺序排列（最近使用的在末尾），过期与超量淘汰都从头部进行
+        self.buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
     
-    def _create_bucket(self) -> TokenBucket:
+    def _create_bucket(self, now: Optional[float] = None) -> TokenBucket:
         """创建新的令牌桶"""
         return TokenBucket(
-            tokens=float(self.burst_size),  # 初始令牌数等于突发容量
-            capacity=self.burst_size,
-            refill_rate=self.refill_rate,
-            last_refill=time.time()
+            tokens=self._capacity,  # 初始令牌数等于突发容量
+            last_refill=_now() if now is None else now
         )
     
-    def _refill_tokens(self, bucket: TokenBucket) -> None:
-        """为令牌桶补充令牌"""
-        now = time.time()
+    def _refill_tokens(self, bucket: TokenBucket, now: Optional[float] = None) -> None:
+        """为令牌桶补充令牌（now 为 time.monotonic() 时间戳，未传入时现取）"""
+        if now is None:
+            now = _now()
         elapsed = now - bucket.last_refill
         
         if elapsed > 0:
-            # 计算应该补充的令牌数
-            tokens_to_add = elapsed * bucket.refill_rate
-            bucket.tokens = min(bucket.capacity, bucket.tokens + tokens_to_add)
+            # 补充令牌并截断到上限
+            tokens = bucket.tokens + elapsed * self.refill_rate
+            bucket.tokens = tokens if tokens < self._capacity else self._capacity
             bucket.last_refill = now
     
-    async def is_allowed(self, key: str, tokens_requested: int = 1) -> bool:
+    def _consume(self, key: str, tokens_requested: int, now: Optional[float]) -> Tuple[bool, TokenBucket]:
+        """获取或创建bucket、补充令牌并尝试扣减，返回 (是否允许, bucket)"""
+        if now is None:
+            now = _now()
+        
+        # 获取或创建bucket（以下直到返回都没有 await，在单线程事件循环中无需加锁）
+        buckets = self.buckets
+        bucket = buckets.get(key)
+        if bucket is None:
+            # 新插入的key本就位于末尾
+            bucket = buckets[key] = self._create_bucket(now)
+        else:
+            buckets.move_to_end(key)
+            if now - bucket.last_refill > BUCKET_IDLE_SECONDS:
+                # 已长时间未活动：原地重置为满桶（复用已有对象，不重新分配）
+                bucket.tokens = self._capacity
+                bucket.last_refill = now
+        
+        # 惰性淘汰：头部是最久未访问的bucket，从头部起连续移除所有过期的bucket
+        # （当前key刚移到末尾且未过期，循环必然终止；未过期时只多一次比较）；超出上限时逐个淘汰
+        while True:
+            head_key = next(iter(buckets))
+            if now - buckets[head_key].last_refill <= BUCKET_IDLE_SECONDS:
+                break
+            del buckets[head_key]
+        while len(buckets) > MAX_BUCKETS:
+            buckets.popitem(last=False)
+        
+        # 补充令牌并扣减（与 _refill_tokens 相同的计算，内联在局部变量上以减少每请求的属性访问和方法调用）
+        tokens = bucket.tokens
+        elapsed = now - bucket.last_refill
+        if elapsed > 0:
+            tokens += elapsed * self.refill_rate
+            if tokens > self._capacity:
+                tokens = self._capacity
+            bucket.last_refill = now
+        
+        # 检查是否有足够的令牌
+        if tokens >= tokens_requested:
+            bucket.tokens = tokens - tokens_requested
+            return True, bucket
+        
+        bucket.tokens = tokens
+        return False, bucket
+    
+    async def is_allowed(self, key: str, tokens_requested: int = 1, now: Optional[float] = None) -> bool:
         """
         检查是否允许请求
         
         Args:
             key: 限流键（通常是IP地址）
             tokens_requested: 请求的令牌数量
+            now: 当前 time.monotonic() 时间戳（同一请求内可复用，未传入时现取）
             
         Returns:
             bool: 是否允许请求
         """
-        # 首次调用时启动清理任务
-        if self._cleanup_task is None:
-            try:
-                self._start_cleanup_task()
-            except (RuntimeError, AttributeError):
-                # 如果没有事件循环或其他异常，使用同步清理作为兜底
-                self._sync_cleanup_if_needed()
-        
-        async with self._lock:
-            # 获取或创建bucket
-            if key not in self.buckets:
-                self.buckets[key] = self._create_bucket()
-            
-            bucket = self.buckets[key]
-            
-            # 补充令牌
-            self._refill_tokens(bucket)
-            
-            # 检查是否有足够的令牌
-            if bucket.tokens >= tokens_requested:
-                bucket.tokens -= tokens_requested
-                return True
+        return self._consume(key, tokens_requested, now)[0]
+    
+    def check(self, key: str, tokens_requested: int = 1,
+              now: Optional[float] = None) -> Tuple[bool, float, float]:
+        """
+        同步检查是否允许请求，并一次性返回扣减后的bucket状态
+        
+        整个过程没有 await，供中间件在请求路径上直接调用，省去协程对象的创建与调度
+        
+        Args:
+            key: 限流键（通常是IP地址）
+            tokens_requested: 请求的令牌数量
+            now: 当前 time.monotonic() 时间戳（同一请求内可复用，未传入时现取）
             
-            return False
+        Returns:
+            Tuple[bool, float, float]: (是否允许请求, 剩余令牌数, 上次补充时间)
+        """
+        allowed, bucket = self._consume(key, tokens_requested, now)
+        return allowed, bucket.tokens, bucket.last_refill
     
-    async def get_bucket_status(self, key: str) -> Optional[Dict]:
+    async def get_bucket_status(self, key: str, now: Optional[float] = None) -> Optional[Dict]:
         """
         获取指定key的bucket状态
         
         Args:
             key: 限流键
+            now: 当前 time.monotonic() 时间戳（未传入时现取）
             
         Returns:
             Dict: bucket状态信息，如果不存在则返回None
         """
-        async with self._lock:
-            if key not in self.buckets:
-                return None
-            
-            bucket = self.buckets[key]
-            self._refill_tokens(bucket)  # 更新令牌数
-            
-            return {
-                "key": key,
-                "tokens": round(bucket.tokens, 2),
-                "capacity": bucket.capacity,
-                "refill_rate": bucket.refill_rate,
-                "last_refill": bucket.last_refill
-            }
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            return None
+        
+        self._refill_tokens(bucket, now)  # 更新令牌数
+        
+        return {
+            "key": key,
+            "tokens": round(bucket.tokens, 2),
+            "capacity": self.burst_size,
+            "refill_rate": self.refill_rate,
+            "last_refill": bucket.last_refill
+        }
     
     async def get_all_buckets_status(self) -> Dict:
         """获取所有bucket的状态"""
-        async with self._lock:
-            now = time.time()
-            buckets_info = []
-            
-            for key, bucket in self.buckets.items():
-                self._refill_tokens(bucket)  # 更新令牌数
-                buckets_info.append({
-                    "key": key,
-                    "tokens": round(bucket.tokens, 2),
-                    "capacity": bucket.capacity,
-                    "refill_rate": bucket.refill_rate,
-                    "last_refill": bucket.last_refill,
-                    "inactive_seconds": round(now - bucket.last_refill, 1)
-                })
-            
-            return {
-                "total_buckets": len(self.buckets),
-                "requests_per_minute": self.requests_per_minute,
-                "burst_size": self.burst_size,
-                "buckets": buckets_info
-            }
+        now = _now()
+        buckets_info = []
+        
+        for key, bucket in self.buckets.items():
+            self._refill_tokens(bucket, now)  # 更新令牌数
+            buckets_info.append({
+                "key": key,
+                "tokens": round(bucket.tokens, 2),
+                "capacity": self.burst_size,
+                "refill_rate": self.refill_rate,
+                "last_refill": bucket.last_refill,
+                "inactive_seconds": round(now - bucket.last_refill, 1)
+            })
+        
+        return {
+            "total_buckets": len(self.buckets),
+            "requests_per_minute": self.requests_per_minute,
+            "burst_size": self.burst_size,
+            "buckets": buckets_info
+        }
 
     async def shutdown(self) -> None:
-        """停止清理任务并释放资源"""
-        if self._cleanup_task:
-            self._cleanup_task.cancel()
-            try:
-                await self._cleanup_task
-            except asyncio.CancelledError:
-                pass
-            self._cleanup_task = None
+        """释放所有bucket"""
         self.buckets.clear()
     
     def get_config(self) -> Dict:
@@ -225,75 +240,143 @@ class RateLimiter:
         }
 
 
-class RateLimitMiddleware(BaseHTTPMiddleware):
-    """FastAPI限流中间件"""
+# 信任代理时获取真实IP：CF-Connecting-IP 是 Cloudflare 提供的原始客户端IP（最可靠），最先单独检查；
+# 其余头部的优先级：(头部名, 是否为逗号分隔的代理链（取第一个IP）)
+# 1. X-Real-IP: nginx 等反向代理设置的真实IP
+# 2. X-Forwarded-For: 标准代理头部
+_PROXY_IP_HEADERS = (("X-Real-IP", False), ("X-Forwarded-For", True))
+# 经过Cloudflare时的优先级
+_CLOUDFLARE_IP_HEADERS = (("X-Forwarded-For", True), ("X-Real-IP", False))
+
+
+@functools.lru_cache(maxsize=4096)
+def _is_valid_ip_str(ip: str) -> bool:
+    """判断字符串是否为合法IP地址（客户端IP高度重复，结果按字符串缓存）"""
+    try:
+        ipaddress.ip_address(ip)
+        return True
+    except ValueError:
+        return False
+
+
+# 按 (IP版本, 网络掩码) 分组的被阻止网段整数集合；判断时每组只需一次按位与加哈希查找，
+# 复杂度取决于不同前缀长度的个数（IPv4最多33组、IPv6最多129组），与网段条目数无关
+BlockedNetworks = Tuple[Tuple[int, int, FrozenSet[int]], ...]
+
+
+def _build_blocked_networks(entries: List[str]) -> BlockedNetworks:
+    """把 CIDR 条目（如 "10.0.0.0/8"）解析为按前缀长度分组的网段表，无效条目忽略"""
+    groups: Dict[Tuple[int, int], set] = {}
+    for entry in entries:
+        try:
+            network = ipaddress.ip_network(entry.strip(), strict=False)
+        except ValueError:
+            _log.warning("⚠️  忽略无效的阻止网段: %s", entry)
+            continue
+        key = (network.version, int(network.netmask))
+        groups.setdefault(key, set()).add(int(network.network_address))
+    return tuple((version, mask, frozenset(networks)) for (version, mask), networks in groups.items())
+
+
+@functools.lru_cache(maxsize=4096)
+def _parse_ip(ip: str) -> Optional[Tuple[int, int]]:
+    """把IP字符串解析为 (IP版本, 整数值)，非法IP返回None（客户端IP高度重复，结果按字符串缓存）"""
+    try:
+        address = ipaddress.ip_address(ip)
+    except ValueError:
+        return None
+    return address.version, int(address)
+
+
+def _ip_in_networks(ip: str, networks: BlockedNetworks) -> bool:
+    """判断IP是否落在任一被阻止网段中"""
+    parsed = _parse_ip(ip)
+    if parsed is None:
+        return False
+    version, value = parsed
+    for net_version, mask, network_values in networks:
+        if net_version == version and (value & mask) in network_values:
+            return True
+    return False
+
+
+class RateLimitMiddleware:
+    """FastAPI限流中间件（纯ASGI实现）"""
     
-    def __init__(self, app, rate_limiter: RateLimiter, enabled: bool = True, trust_proxy: bool = True, 
+    def __init__(self, app: ASGIApp, rate_limiter: Optional[RateLimiter], enabled: bool = True, trust_proxy: bool = True, 
                  ip_block_enabled: bool = False, blocked_ips_file: str = "app/data/blocked_ips.json"):
-        super().__init__(app)
+        self.app = app
         self.rate_limiter = rate_limiter
         self.enabled = enabled
         self.trust_proxy = trust_proxy
         self.ip_block_enabled = ip_block_enabled
         self.blocked_ips_file = blocked_ips_file
-        self._blocked_ips: List[str] = []
+        # 阻止列表：(单个IP的 frozenset, CIDR 网段表)。两者作为一个元组整体替换，
+        # 后台线程重新加载时请求不会看到新网段配旧IP的中间状态
+        self._blocked: Tuple[FrozenSet[str], BlockedNetworks] = (frozenset(), ())
         self._last_file_check = 0
+        # 监听阻止IP文件变化的后台任务（随应用 lifespan 启动和取消）
+        self._watch_task: Optional[asyncio.Task] = None
         
         # 初始加载阻止IP列表
         if self.ip_block_enabled:
             self._load_blocked_ips()
     
-    def _get_client_ip(self, request: Request) -> str:
-        """获取客户端IP地址"""
-        # 如果不信任代理，直接使用连接IP
-        if not self.trust_proxy:
-            if request.client and hasattr(request.client, 'host') and request.client.host:
-                return request.client.host
-            return "unknown-client"
-        
-        # 信任代理的情况下，按优先级获取真实IP
-        # 1. CF-Connecting-IP: Cloudflare 提供的原始客户端IP（最可靠）
-        cf_connecting_ip = request.headers.get("CF-Connecting-IP")
-        if cf_connecting_ip and self._is_valid_ip(cf_connecting_ip.strip()):
-            return cf_connecting_ip.strip()
-        
-        # 2. CF-Ray 和 CF-IPCountry 等Cloudflare头部存在时，说明经过了Cloudflare
-        # 这种情况下应该优先检查 X-Forwarded-For
-        cloudflare_headers = ["CF-Ray", "CF-IPCountry", "CF-Visitor"]
-        if any(request.headers.get(header) for header in cloudflare_headers):
-            forwarded_for = request.headers.get("X-Forwarded-For")
-            if forwarded_for:
-                first_ip = forwarded_for.split(",")[0].strip()
-                if self._is_valid_ip(first_ip):
-                    return first_ip
-        
-        # 3. X-Real-IP: nginx 等反向代理设置的真实IP
-        real_ip = request.headers.get("X-Real-IP")
-        if real_ip and self._is_valid_ip(real_ip.strip()):
-            return real_ip.strip()
-        
-        # 4. X-Forwarded-For: 标准代理头部（取第一个IP）
-        forwarded_for = request.headers.get("X-Forwarded-For")
-        if forwarded_for:
-            first_ip = forwarded_for.split(",")[0].strip()
-            if self._is_valid_ip(first_ip):
-                return first_ip
-        
-        # 5. 最后使用连接IP（在没有代理时最可靠）
-        if request.client and hasattr(request.client, 'host') and request.client.host:
-            return request.client.host
-        
-        # 6. 对于无法获取IP的情况，使用统一的限流策略
+    @property
+    def trust_proxy(self) -> bool:
+        """是否信任代理头部中的客户端IP"""
+        return self._trust_proxy
+    
+    @trust_proxy.setter
+    def trust_proxy(self, value: bool) -> None:
+        # trust_proxy 在中间件生命周期内基本不变，设置时直接绑定对应的IP获取实现，请求路径上不再判断
+        self._trust_proxy = value
+        self._get_client_ip = self._get_client_ip_proxied if value else self._get_client_ip_direct
+    
+    def _get_client_ip_direct(self, request: Request) -> str:
+        """获取客户端IP地址（不信任代理：直接使用连接IP）"""
+        # 连接IP（在没有代理时最可靠）
+        client = request.client
+        if client and client.host:
+            return client.host
+        
+        # 对于无法获取IP的情况，使用统一的限流策略
         return "unknown-client"
     
+    def _get_client_ip_proxied(self, request: Request) -> str:
+        """获取客户端IP地址（信任代理：按优先级从代理头部获取真实IP）"""
+        headers = request.headers
+        cf_ip = headers.get("CF-Connecting-IP")
+        if cf_ip:
+            # 有 CF-Connecting-IP 即说明经过了Cloudflare，合法时直接采用，无需再查其他Cloudflare头部
+            ip = cf_ip.strip()
+            if _is_valid_ip_str(ip):
+                return ip
+            priority = _CLOUDFLARE_IP_HEADERS
+        elif headers.get("CF-Ray") or headers.get("CF-IPCountry") or headers.get("CF-Visitor"):
+            # CF-Ray 和 CF-IPCountry 等Cloudflare头部存在时，说明经过了Cloudflare，
+            # 这种情况下 X-Forwarded-For 优先于 X-Real-IP
+            priority = _CLOUDFLARE_IP_HEADERS
+        else:
+            priority = _PROXY_IP_HEADERS
+        for header, is_chain in priority:
+            value = headers.get(header)
+            if value:
+                if is_chain:
+                    # 只取链中第一个IP：定位首个逗号切片，不为整条代理链构建列表
+                    comma = value.find(",")
+                    if comma != -1:
+                        value = value[:comma]
+                ip = value.strip()
+                if _is_valid_ip_str(ip):
+                    return ip
+        
+        # 最后使用连接IP
+        return self._get_client_ip_direct(request)
+    
     def _is_valid_ip(self, ip: str) -> bool:
         """验证IP地址格式（支持IPv4和IPv6）"""
-        try:
-            import ipaddress
-            ipaddress.ip_address(ip)
-            return True
-        except (ValueError, ipaddress.AddressValueError):
-            return False
+        return _is_valid_ip_str(ip)
     
     def _load_blocked_ips(self) -> None:
         """从文件加载阻止的IP列表"""
@@ -301,15 +384,25 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
             blocked_ips_path = Path(self.blocked_ips_file)
             if blocked_ips_path.exists():
                 with open(blocked_ips_path, 'r', encoding='utf-8') as f:
-                    self._blocked_ips = json.load(f)
+                    # 只保留字符串项，非字符串（如数字、null）不可能匹配客户端IP
+                    entries = [ip for ip in json.load(f) if isinstance(ip, str)]
+                # 单个IP走精确匹配；带 "/" 的条目作为 CIDR 网段
+                ips = frozenset(ip for ip in entries if "/" not in ip)
+                networks = _build_blocked_networks([ip for ip in entries if "/" in ip])
+                self._blocked = (ips, networks)
                 self._last_file_check = time.time()
-                print(f"🔒 加载了 {len(self._blocked_ips)} 个阻止IP")
+                _log.info("🔒 加载了 %d 个阻止IP、%d 个阻止网段", len(ips),
+                          sum(len(values) for _, _, values in networks))
             else:
-                self._blocked_ips = []
-                print(f"⚠️  阻止IP文件不存在: {blocked_ips_path}")
+                self._blocked = (frozenset(), ())
+                _log.warning("⚠️  阻止IP文件不存在: %s", blocked_ips_path)
         except Exception as e:
-            print(f"❌ 加载阻止IP列表时出错: {e}")
-            self._blocked_ips = []
+            _log.error("❌ 加载阻止IP列表时出错: %s", e)
+            self._blocked = (frozenset(), ())
+    
+    async def _load_blocked_ips_async(self) -> None:
+        """在线程池中读取并解析阻止IP文件，文件较大时也不会阻塞事件循环（结果整体替换，读取期间沿用旧列表）"""
+        await asyncio.to_thread(self._load_blocked_ips)
     
     def _refresh_blocked_ips_if_needed(self) -> None:
         """如果需要，刷新阻止IP列表（每60秒检查一次文件修改）"""
@@ -324,34 +417,66 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
                 else:
                     self._last_file_check = now
             except Exception as e:
-                print(f"❌ 检查阻止IP文件时出错: {e}")
+                _log.error("❌ 检查阻止IP文件时出错: %s", e)
+    
+    def _start_watch_task(self) -> None:
+        """应用启动时在当前事件循环上启动阻止IP文件监听任务"""
+        if watchfiles is None or not self.ip_block_enabled:
+            return
+        task = self._watch_task
+        if task is not None and not task.done():
+            return
+        self._watch_task = asyncio.get_running_loop().create_task(self._watch_blocked_ips())
+    
+    def _stop_watch_task(self) -> None:
+        """应用关闭时取消阻止IP文件监听任务"""
+        task, self._watch_task = self._watch_task, None
+        if task is not None:
+            task.cancel()
+    
+    async def _watch_blocked_ips(self) -> None:
+        """监听阻止IP文件变化并即时重新加载（inotify等系统事件，请求路径上不再stat文件）"""
+        target = Path(self.blocked_ips_file).resolve()
+        # 监听开始前文件可能已变化，先重新加载一次
+        await self._load_blocked_ips_async()
+        # 监听所在目录，以便文件被删除后重建、或原子替换时也能收到事件
+        try:
+            async for _ in watchfiles.awatch(target.parent, watch_filter=lambda _, path: Path(path) == target):
+                await self._load_blocked_ips_async()
+        except Exception as e:
+            # 任务结束后 _is_ip_blocked 自动回退到定期检查文件修改
+            _log.error("❌ 监听阻止IP文件时出错，回退到定期检查: %s", e)
     
     def _is_ip_blocked(self, ip: str) -> bool:
         """检查IP是否被阻止"""
         if not self.ip_block_enabled:
             return False
-            
-        # 刷新阻止IP列表（如果需要）
-        self._refresh_blocked_ips_if_needed()
         
-        return ip in self._blocked_ips
+        # 没有文件监听任务时（未安装watchfiles或监听失败），回退到定期检查文件修改
+        task = self._watch_task
+        if task is None or task.done():
+            self._refresh_blocked_ips_if_needed()
+        
+        ips, networks = self._blocked
+        if ip in ips:
+            return True
+        return bool(networks) and _ip_in_networks(ip, networks)
     
     def _should_skip_rate_limit(self, request: Request) -> bool:
         """判断是否应该跳过限流检查"""
         # 所有请求都进行限流检查，不跳过任何路径
         return False
     
-    async def dispatch(self, request: Request, call_next):
-        """中间件处理逻辑"""
-        # 获取日志实例
-        logger = None
-        try:
-            from app.utils.logger import get_logger
-            logger = get_logger()
-        except (ImportError, Exception) as e:
-            # 记录导入失败但不影响功能
-            print(f"⚠️ 无法导入日志模块: {e}")
-            logger = None
+    async def _check_request(self, request: Request) -> Tuple[Optional[Response], Optional[List[Tuple[bytes, bytes]]]]:
+        """
+        执行IP阻止和限流检查
+        
+        Returns:
+            (拦截响应, 限流响应头)：拦截响应不为None时直接返回它，不再继续处理；
+            限流响应头为需要追加到正常响应上的 X-RateLimit-* 头部（未启用限流时为None）
+        """
+        # 获取日志实例（未初始化时为None）
+        logger = get_logger()
         
         # 获取客户端IP
         client_ip = self._get_client_ip(request)
@@ -369,67 +494,106 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
         
         if is_blocked:
             # 被阻止的IP直接断开连接，不返回任何内容
-            from starlette.responses import Response
-            return Response(status_code=444)  # 444状态码：Connection Closed Without Response
-        
-        # 如果限流未启用，跳过限流检查
-        if not self.enabled:
-            response = await call_next(request)
-            # 注意：不在中间件中记录响应体，因为无法获取响应体内容
-            # 响应体记录将在主处理函数中完成
-            return response
-        
-        # 检查是否需要跳过限流
-        if self._should_skip_rate_limit(request):
-            response = await call_next(request)
-            # 注意：不在中间件中记录响应体，因为无法获取响应体内容
-            # 响应体记录将在主处理函数中完成
-            return response
-        
-        # 检查是否允许请求
-        allowed = await self.rate_limiter.is_allowed(client_ip)
-        bucket_status = await self.rate_limiter.get_bucket_status(client_ip)
+            return Response(status_code=444), None  # 444状态码：Connection Closed Without Response
         
-        if logger:
-            logger.log_rate_limit(client_ip, allowed, bucket_status)
+        # 如果限流未启用（仅启用了IP阻止，此时 rate_limiter 可为 None）或需要跳过限流，直接放行
+        if not self.enabled or self._should_skip_rate_limit(request):
+            return None, None
+        
+        # 检查是否允许请求，同时拿到扣减后的令牌数
+        allowed, tokens, last_refill = self.rate_limiter.check(client_ip)
+        
+        if logger and logger.is_enabled_for(logging.DEBUG if allowed else logging.WARNING):
+            logger.log_rate_limit(client_ip, allowed, {
+                "key": client_ip,
+                "tokens": round(tokens, 2),
+                "capacity": self.rate_limiter.burst_size,
+                "refill_rate": self.rate_limiter.refill_rate,
+                "last_refill": last_refill
+            })
         
         if not allowed:
-            # 获取bucket状态用于返回剩余信息
-            bucket_status = await self.rate_limiter.get_bucket_status(client_ip)
+            # 重试时间（基于令牌补充速率，初始化时已算好）
+            retry_after = self.rate_limiter._retry_after_seconds
             
-            # 计算重试时间（基于令牌补充速率）
-            retry_after = int(60 / self.rate_limiter.requests_per_minute) + 1
-            
-            # 返回429状态码
-            raise HTTPException(
+            # 直接返回429响应（响应体与 HTTPException 的默认格式一致），
+            # 避免在中间件里抛异常：既省去异常与回溯的开销，也不会被外层当作未处理异常变成500
+            return _RejectionResponse(
                 status_code=429,
-                detail={
+                content={"detail": {
                     "error": "请求频率限制",
                     "message": f"来自 {client_ip} 的请求过于频繁",
                     "requests_per_minute": self.rate_limiter.requests_per_minute,
                     "burst_size": self.rate_limiter.burst_size,
-                    "current_tokens": bucket_status["tokens"] if bucket_status else 0,
+                    "current_tokens": round(tokens, 2),
                     "retry_after": retry_after
-                },
+                }},
                 headers={
-                    "Retry-After": str(retry_after),
-                    "X-RateLimit-Limit": str(self.rate_limiter.requests_per_minute),
-                    "X-RateLimit-Remaining": str(int(bucket_status["tokens"]) if bucket_status else 0),
+                    "Retry-After": self.rate_limiter._retry_after_str,
+                    "X-RateLimit-Limit": self.rate_limiter._rpm_str,
+                    "X-RateLimit-Remaining": str(int(tokens)),
                     "X-RateLimit-Reset": str(int(time.time()) + retry_after)
                 }
-            )
+            ), None
         
-        # 请求通过，继续处理
-        response = await call_next(request)
+        # 请求通过：以预编码的原始头部元组一次性追加限流信息（X-RateLimit-Reset 需要墙上时钟的epoch秒）
+        return None, [
+            (b"x-ratelimit-limit", self.rate_limiter._rpm_bytes),
+            (b"x-ratelimit-remaining", str(int(tokens)).encode()),
+            (b"x-ratelimit-reset", str(int(time.time()) + 60).encode()),
+        ]
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """ASGI入口：直接处理原始 scope/send，不经过 BaseHTTPMiddleware 的任务组和内存流"""
+        if scope["type"] == "lifespan":
+            await self._run_lifespan(scope, receive, send)
+            return
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        rejection, rate_limit_headers = await self._check_request(Request(scope))
+        if rejection is not None:
+            await rejection(scope, receive, send)
+            return
         
-        # 在响应头中添加限流信息
-        bucket_status = await self.rate_limiter.get_bucket_status(client_ip)
-        if bucket_status:
-            response.headers["X-RateLimit-Limit"] = str(self.rate_limiter.requests_per_minute)
-            response.headers["X-RateLimit-Remaining"] = str(int(bucket_status["tokens"]))
-            response.headers["X-RateLimit-Reset"] = str(int(bucket_status["last_refill"]) + 60)
+        if not rate_limit_headers:
+            await self.app(scope, receive, send)
+            return
         
+        async def send_with_rate_limit_headers(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", ())) + rate_limit_headers
+            await send(message)
+        
+        await self.app(scope, receive, send_with_rate_limit_headers)
+    
+    async def _run_lifespan(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """透传 lifespan 事件：启动时开始监听阻止IP文件，关闭时取消监听"""
+        async def receive_with_watch_task() -> Message:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                self._start_watch_task()
+            elif message["type"] == "lifespan.shutdown":
+                self._stop_watch_task()
+            return message
+        
+        try:
+            await self.app(scope, receive_with_watch_task, send)
+        finally:
+            self._stop_watch_task()
+    
+    async def dispatch(self, request: Request, call_next):
+        """
+        以 call_next 方式处理单个请求（与 __call__ 共用同一套检查逻辑，便于直接调用）
+        """
+        rejection, rate_limit_headers = await self._check_request(request)
+        if rejection is not None:
+            return rejection
+        
+        response = await call_next(request)
         # 注意：不在中间件中记录响应体，因为无法获取响应体内容
         # 响应体记录将在主处理函数中完成
-        
-        return response
\ No newline at end of file
+        if rate_limit_headers:
+            response.raw_headers.extend(rate_limit_headers)
+        return response
@@ -6,6 +6,9 @@
 
 import os
 import json
+import queue
+import asyncio
+import atexit
 import logging
 import logging.handlers
 from datetime import datetime, timezone, timedelta
@@ -13,74 +16,110 @@ from pathlib import Path
 from typing import Dict, Any, Optional
 from fastapi import Request, Response
 
+# 日志JSON优先用 orjson 序列化（直接输出UTF-8，不转义中文），未安装时回退到标准库json
+try:
+    import orjson
+
+    # orjson.JSONDecodeError 是 json.JSONDecodeError 的子类，原有的异常处理无需改动
+    _loads = orjson.loads
+
+    def _dumps(obj: Any) -> str:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+        except TypeError:
+            # orjson 不支持的少数情况（如超过64位的整数）交给标准库处理
+            return json.dumps(obj, ensure_ascii=False, separators=(',', ':'))
+except ImportError:
+    orjson = None
+    _loads = json.loads
+
+    def _dumps(obj: Any) -> str:
+        return json.dumps(obj, ensure_ascii=False, separators=(',', ':'))
+
+# UTC+8 时区对象，只构造一次，取时间时直接换算，不再每次做 timedelta 加法
+_UTC8 = timezone(timedelta(hours=8))
+
 # 模型回复字段预览长度
 MODEL_PREVIEW_LENGTH = 250
 
 
+def _truncate_field(container: dict, field: str, limit: int) -> Optional[dict]:
+    """若 container[field] 是超长字符串，返回截断后的副本，否则返回None（不复制）"""
+    value = container.get(field)
+    if type(value) is str and len(value) > limit:
+        container_copy = container.copy()
+        container_copy[field] = value[:limit] + "...[truncated]"
+        return container_copy
+    return None
+
+
+def _truncate_choice(choice: dict, limit: int) -> Optional[dict]:
+    """截断单个choice中的 message.content / text / delta.content，无需截断时返回None"""
+    choice_copy = None
+    
+    # 处理message.content字段和delta.content字段（流式响应中的choices）
+    for key in ("message", "delta"):
+        nested = choice.get(key)
+        if isinstance(nested, dict):
+            nested_copy = _truncate_field(nested, "content", limit)
+            if nested_copy is not None:
+                if choice_copy is None:
+                    choice_copy = choice.copy()
+                choice_copy[key] = nested_copy
+    
+    # 处理text字段
+    text = choice.get("text")
+    if type(text) is str and len(text) > limit:
+        if choice_copy is None:
+            choice_copy = choice.copy()
+        choice_copy["text"] = text[:limit] + "...[truncated]"
+    
+    return choice_copy
+
+
+def _parse_body_for_log(body_text: str, truncate) -> Any:
+    """把JSON文本解析为日志用的对象；文本本身不超过截断长度时，其中任何字段都不可能需要截断，跳过截断处理"""
+    body_json = _loads(body_text)
+    if len(body_text) <= MODEL_PREVIEW_LENGTH:
+        return body_json
+    return truncate(body_json)
+
+
 def truncate_model_content(data: Any, limit: int = MODEL_PREVIEW_LENGTH) -> Any:
-    """截断模型回复字段以限制日志体积"""
+    """截断模型回复字段以限制日志体积（只复制确实需要截断的部分，原始数据不被修改）"""
     if not isinstance(data, dict):
         return data
 
     # 创建数据副本以避免修改原始数据
     result = data.copy()
     
-    # 处理非流式响应格式（choices数组）
+    # 处理非流式响应格式（choices数组）：大多数回复都很短，只有需要截断时才复制choice
     choices = result.get("choices")
-    if isinstance(choices, list):
-        # 创建choices数组的副本
-        result["choices"] = []
-        for choice in choices:
+    if isinstance(choices, list) and choices:
+        new_choices = None
+        for index, choice in enumerate(choices):
             if not isinstance(choice, dict):
-                result["choices"].append(choice)
                 continue
-            
-            # 创建choice的副本
-            choice_copy = choice.copy()
-            
-            # 处理message.content字段
-            message = choice_copy.get("message")
-            if isinstance(message, dict):
-                content = message.get("content")
-                if isinstance(content, str) and len(content) > limit:
-                    message_copy = message.copy()
-                    message_copy["content"] = content[:limit] + "...[truncated]"
-                    choice_copy["message"] = message_copy
-            
-            # 处理text字段
-            text = choice_copy.get("text")
-            if isinstance(text, str) and len(text) > limit:
-                choice_copy["text"] = text[:limit] + "...[truncated]"
-            
-            # 处理delta.content字段（流式响应中的choices）
-            delta = choice_copy.get("delta")
-            if isinstance(delta, dict):
-                content = delta.get("content")
-                if isinstance(content, str) and len(content) > limit:
-                    delta_copy = delta.copy()
-                    delta_copy["content"] = content[:limit] + "...[truncated]"
-                    choice_copy["delta"] = delta_copy
-            
-            result["choices"].append(choice_copy)
+            choice_copy = _truncate_choice(choice, limit)
+            if choice_copy is not None:
+                if new_choices is None:
+                    new_choices = list(choices)
+                new_choices[index] = choice_copy
+        if new_choices is not None:
+            result["choices"] = new_choices
     
     # 处理流式响应格式（根级delta.content字段）
     delta = result.get("delta")
     if isinstance(delta, dict):
-        content = delta.get("content")
-        if isinstance(content, str) and len(content) > limit:
-            delta_copy = delta.copy()
-            delta_copy["content"] = content[:limit] + "...[truncated]"
+        delta_copy = _truncate_field(delta, "content", limit)
+        if delta_copy is not None:
             result["delta"] = delta_copy
     
-    # 处理直接的content字段（某些API格式）
-    content = result.get("content")
-    if isinstance(content, str) and len(content) > limit:
-        result["content"] = content[:limit] + "...[truncated]"
-    
-    # 处理text字段（某些API格式）
-    text = result.get("text")
-    if isinstance(text, str) and len(text) > limit:
-        result["text"] = text[:limit] + "...[truncated]"
+    # 处理直接的content字段和text字段（某些API格式）
+    for field in ("content", "text"):
+        value = result.get(field)
+        if type(value) is str and len(value) > limit:
+            result[field] = value[:limit] + "...[truncated]"
     
     return result
 
@@ -151,9 +190,7 @@ class UTC8Formatter(logging.Formatter):
     
     def formatTime(self, record, datefmt=None):
         """格式化时间为UTC+8"""
-        # 获取UTC时间并转换为UTC+8
-        utc_time = datetime.fromtimestamp(record.created, timezone.utc)
-        utc8_time = utc_time + timedelta(hours=8)
+        utc8_time = datetime.fromtimestamp(record.created, _UTC8)
         
         if datefmt:
             return utc8_time.strftime(datefmt)
@@ -162,7 +199,44 @@ class UTC8Formatter(logging.Formatter):
     
     def converter(self, timestamp):
         """时间戳转换器"""
-        return datetime.fromtimestamp(timestamp, timezone.utc) + timedelta(hours=8)
+        return datetime.fromtimestamp(timestamp, _UTC8)
+
+
+class _EventLoopQueueHandler(logging.handlers.QueueHandler):
+    """在事件循环线程中把日志记录放入队列由后台线程写出；没有运行中的事件循环时（命令行、同步调用）直接写入"""
+    
+    def __init__(self, log_queue: queue.SimpleQueue, target: logging.Handler):
+        super().__init__(log_queue)
+        self.target = target
+    
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            # 同步上下文没有需要保护的事件循环，直接写入，写完即可读到
+            self.target.handle(record)
+            return
+        super().emit(record)
+
+
+# 后台写日志文件的队列监听器（同一时间只有一个；重新初始化日志时先停止旧的）
+_queue_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def _stop_queue_listener() -> None:
+    """停止队列监听器：写完队列中剩余的日志并关闭文件处理器"""
+    global _queue_listener
+    listener = _queue_listener
+    if listener is None:
+        return
+    _queue_listener = None
+    listener.stop()
+    for handler in listener.handlers:
+        handler.close()
+
+
+# 进程退出前把队列中尚未写出的日志落盘
+atexit.register(_stop_queue_listener)
 
 
 class CILRouterLogger:
@@ -179,6 +253,8 @@ class CILRouterLogger:
         self.log_level = log_level.upper()
         self.log_dir = Path(log_dir)
         self.logger = None
+        # DEBUG级别是否启用（日志等级初始化后不再变化，请求路径上的大多数记录方法只需读这个布尔值）
+        self._debug_enabled = False
         
         # 确保日志目录存在
         self.log_dir.mkdir(parents=True, exist_ok=True)
@@ -198,6 +274,7 @@ class CILRouterLogger:
         for handler in list(self.logger.handlers):
             handler.close()
             self.logger.removeHandler(handler)
+        _stop_queue_listener()
         
         # 设置日志等级
         level_map = {
@@ -207,6 +284,7 @@ class CILRouterLogger:
             "ERROR": logging.ERROR
         }
         self.logger.setLevel(level_map.get(self.log_level, logging.DEBUG))
+        self._debug_enabled = self.logger.isEnabledFor(logging.DEBUG)
         
         # 创建轮转文件处理器 (12MB轮转，最多8192份)
         log_file = self.log_dir / "cilrouter.log"
@@ -217,15 +295,22 @@ class CILRouterLogger:
             encoding='utf-8'
         )
         
-        # 设置日志格式（使用UTC+8时区）
+        # 设置日志格式（使用UTC+8时区）；结构化日志都经由 _log_with_data 写出，
+        # 调用位置恒为本模块，因此不再记录 filename/funcName/lineno
         formatter = UTC8Formatter(
-            fmt='[%(asctime)s|%(levelname)-8s|%(name)s|%(filename)s:%(funcName)s():%(lineno)d]:%(message)s',
+            fmt='[%(asctime)s|%(levelname)-8s|%(name)s]:%(message)s',
             datefmt='%Y-%m-%d %H:%M:%S',
             style='%'
         )
         handler.setFormatter(formatter)
         
-        self.logger.addHandler(handler)
+        # 事件循环中只把日志记录放入队列，格式化、写文件和轮转（rename）都在后台线程完成，不阻塞请求处理
+        global _queue_listener
+        log_queue = queue.SimpleQueue()
+        _queue_listener = logging.handlers.QueueListener(log_queue, handler)
+        _queue_listener.start()
+        
+        self.logger.addHandler(_EventLoopQueueHandler(log_queue, handler))
         
         # 防止日志传播到根logger
         self.logger.propagate = False
@@ -234,6 +319,10 @@ class CILRouterLogger:
         """检查日志是否启用"""
         return self.logger is not None
     
+    def is_enabled_for(self, level: int) -> bool:
+        """检查指定等级的日志是否会被记录（用于在构造日志数据前提前返回）"""
+        return self.logger is not None and self.logger.isEnabledFor(level)
+    
     def debug(self, message: str, extra_data: Dict[str, Any] = None):
         """记录DEBUG级别日志"""
         if self.logger and self.logger.isEnabledFor(logging.DEBUG):
@@ -267,17 +356,22 @@ class CILRouterLogger:
         
         try:
             # 将字典转换为JSON字符串
-            json_str = json.dumps(log_entry, ensure_ascii=False, separators=(',', ':'))
-            self.logger.log(level, json_str)
+            json_str = _dumps(log_entry)
         except (TypeError, ValueError) as e:
             # 如果仍然无法序列化，记录简化版本
-            simple_entry = {"message": message, "serialization_error": str(e)}
-            json_str = json.dumps(simple_entry, ensure_ascii=False, separators=(',', ':'))
-            self.logger.log(level, json_str)
+            json_str = _dumps({"message": message, "serialization_error": str(e)})
+        
+        # 直接构造日志记录交给处理器，跳过 Logger.log 中查找调用位置的栈帧遍历（格式中已不使用）
+        logger = self.logger
+        if logger.isEnabledFor(level):
+            logger.handle(logger.makeRecord(logger.name, level, "(unknown file)", 0, json_str, (), None))
     
     def _sanitize_data(self, data: Any) -> Any:
         """清理数据，使其可以JSON序列化"""
-        if isinstance(data, dict):
+        if data is None or type(data) in (str, int, float, bool):
+            # 基本类型（最常见的叶子节点）可直接序列化，无需逐个试探
+            return data
+        elif isinstance(data, dict):
             return {k: self._sanitize_data(v) for k, v in data.items()}
         elif isinstance(data, list):
             return [self._sanitize_data(item) for item in data]
@@ -305,7 +399,7 @@ class CILRouterLogger:
     
     def log_request_start(self, request: Request, client_ip: str):
         """记录请求开始"""
-        if not self.is_enabled():
+        if not self._debug_enabled:
             return
         
         # 获取请求体（如果有）
@@ -315,8 +409,9 @@ class CILRouterLogger:
             "method": request.method,
             "url": str(request.url),
             "path": request.url.path,
-            "query": dict(request.query_params),
-            "headers": dict(request.headers),
+            # 用 items() 一次遍历构造字典；dict(headers) 会对每个键再线性查找一遍，头部多时是O(N²)
+            "query": dict(request.query_params.items()),
+            "headers": dict(request.headers.items()),
             "client_ip": client_ip,
             "timestamp": get_utc8_timestamp()
         }
@@ -325,7 +420,7 @@ class CILRouterLogger:
     
     def log_request_body(self, body: bytes):
         """记录请求体"""
-        if not self.is_enabled():
+        if not self._debug_enabled:
             return
         
         try:
@@ -334,9 +429,8 @@ class CILRouterLogger:
                 body_text = body.decode('utf-8')
                 # 尝试解析为JSON，如果失败就记录原始文本
                 try:
-                    body_json = json.loads(body_text)
                     # 对JSON请求体中的文本内容应用截断逻辑
-                    truncated_body = truncate_request_content(body_json)
+                    truncated_body = _parse_body_for_log(body_text, truncate_request_content)
                     body_data = {"type": "request_body", "body": truncated_body}
                 except json.JSONDecodeError:
                     # 对原始文本应用长度限制
@@ -359,13 +453,13 @@ class CILRouterLogger:
     
     def log_response(self, response: Response, body_content: bytes = None):
         """记录响应信息"""
-        if not self.is_enabled():
+        if not self._debug_enabled:
             return
         
         response_data = {
             "type": "response",
             "status_code": response.status_code,
-            "headers": dict(response.headers),
+            "headers": dict(response.headers.items()),
             "timestamp": get_utc8_timestamp()
         }
         
@@ -376,8 +470,7 @@ class CILRouterLogger:
                     body_text = body_content.decode('utf-8')
                     # 尝试解析为JSON
                     try:
-                        body_json = json.loads(body_text)
-                        response_data["body"] = truncate_model_content(body_json)
+                        response_data["body"] = _parse_body_for_log(body_text, truncate_model_content)
                     except json.JSONDecodeError:
                         response_data["body"] = body_text
                 else:
@@ -389,14 +482,14 @@ class CILRouterLogger:
     
     def log_forward_request(self, method: str, url: str, headers: Dict[str, str], body: bytes = None, attempt: int = 1):
         """记录转发请求"""
-        if not self.is_enabled():
+        if not self._debug_enabled:
             return
         
         forward_data = {
             "type": "forward_request",
             "method": method,
             "url": url,
-            "headers": headers,
+            "headers": dict(headers.items()),
             "attempt": attempt,
             "timestamp": get_utc8_timestamp()
         }
@@ -407,9 +500,8 @@ class CILRouterLogger:
                 if body:
                     body_text = body.decode('utf-8')
                     try:
-                        body_json = json.loads(body_text)
                         # 转发请求体使用请求内容截断逻辑（截断用户输入）
-                        forward_data["body"] = truncate_request_content(body_json)
+                        forward_data["body"] = _parse_body_for_log(body_text, truncate_request_content)
                     except json.JSONDecodeError:
                         # 对非JSON文本也应用长度限制
                         if len(body_text) > MODEL_PREVIEW_LENGTH:
@@ -425,13 +517,13 @@ class CILRouterLogger:
     
     def log_forward_response(self, status_code: int, headers: Dict[str, str], body: bytes = None):
         """记录转发响应"""
-        if not self.is_enabled():
+        if not self._debug_enabled:
             return
         
         response_data = {
             "type": "forward_response",
             "status_code": status_code,
-            "headers": headers,
+            "headers": dict(headers.items()),
             "timestamp": get_utc8_timestamp()
         }
         
@@ -441,8 +533,7 @@ class CILRouterLogger:
                 if body:
                     body_text = body.decode('utf-8')
                     try:
-                        body_json = json.loads(body_text)
-                        response_data["body"] = truncate_model_content(body_json)
+                        response_data["body"] = _parse_body_for_log(body_text, truncate_model_content)
                     except json.JSONDecodeError:
                         response_data["body"] = body_text
                 else:
@@ -454,7 +545,7 @@ class CILRouterLogger:
     
     def log_rate_limit(self, client_ip: str, allowed: bool, bucket_status: Dict[str, Any] = None):
         """记录限流信息"""
-        if not self.is_enabled():
+        if not self.is_enabled_for(logging.DEBUG if allowed else logging.WARNING):
             return
         
         rate_limit_data = {
@@ -474,7 +565,7 @@ class CILRouterLogger:
     
     def log_ip_block(self, client_ip: str, blocked: bool):
         """记录IP阻止信息"""
-        if not self.is_enabled():
+        if not self.is_enabled_for(logging.WARNING if blocked else logging.DEBUG):
             return
         
         block_data = {
@@ -491,7 +582,7 @@ class CILRouterLogger:
     
     def log_provider_switch(self, old_index: int, new_index: int, success: bool):
         """记录供应商切换"""
-        if not self.is_enabled():
+        if not self.is_enabled_for(logging.INFO if success else logging.ERROR):
             return
         
         switch_data = {
@@ -509,7 +600,7 @@ class CILRouterLogger:
     
     def log_error(self, error_type: str, error_message: str, error_details: Dict[str, Any] = None):
         """记录错误信息"""
-        if not self.is_enabled():
+        if not self.is_enabled_for(logging.ERROR):
             return
         
         error_data = {
@@ -527,7 +618,7 @@ class CILRouterLogger:
 
 def get_utc8_timestamp() -> str:
     """获取UTC+8时区的时间戳字符串"""
-    return (datetime.now(timezone.utc) + timedelta(hours=8)).isoformat()
+    return datetime.now(_UTC8).isoformat()
 
 
 # 全局日志实例，将在配置加载后初始化
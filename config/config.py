@@ -5,8 +5,12 @@
 """
 
 import os
+import re
 import random
-from typing import List, Dict, Any
+import threading
+import itertools
+import functools
+from typing import List, Dict, Any, Tuple, Optional
 
 # 默认供应商配置（支持多URL负载均衡）
 DEFAULT_PROVIDERS = [
@@ -20,20 +24,28 @@ DEFAULT_PROVIDERS = [
     }
 ]
 
+# URL格式（模块加载时编译一次）
+_URL_PATTERN = re.compile(r'^https?://.+$')
+
+# 两个校验函数都是纯函数，重载配置时相同的URL/Key无需重复校验
+@functools.lru_cache(maxsize=1024)
 def _validate_url(url: str) -> bool:
     """验证URL格式"""
     try:
-        import re
-        url_pattern = r'^https?://.+$'
-        return bool(re.match(url_pattern, url.strip()))
-    except:
+        return bool(_URL_PATTERN.match(url.strip()))
+    except (AttributeError, TypeError):
         return False
 
+@functools.lru_cache(maxsize=1024)
 def _validate_api_key(key: str) -> bool:
     """验证API Key格式（基本检查）"""
     key = key.strip()
-    # 基本检查：长度和字符
-    return len(key) > 10 and all(c.isprintable() for c in key)
+    # 基本检查：长度和字符（str.isprintable 在C层一次遍历整个字符串）
+    return len(key) > 10 and key.isprintable()
+
+def _env_flag(name: str, default: str) -> bool:
+    """读取布尔型环境变量（大小写不敏感，仅 "true" 为真）"""
+    return os.environ.get(name, default).lower() == 'true'
 
 def load_providers_from_env() -> List[Dict[str, List[str]]]:
     """
@@ -44,15 +56,16 @@ def load_providers_from_env() -> List[Dict[str, List[str]]]:
     """
     providers = []
     index = 0
+    env = os.environ
     
     while True:
-        base_urls_str = os.getenv(f'PROVIDER_{index}_BASE_URL')
-        api_keys_str = os.getenv(f'PROVIDER_{index}_API_KEY')
+        base_urls_str = env.get(f'PROVIDER_{index}_BASE_URL')
+        api_keys_str = env.get(f'PROVIDER_{index}_API_KEY')
         
         if base_urls_str and api_keys_str:
             # 解析逗号分隔的URL和API Key列表
-            base_urls = [url.strip() for url in base_urls_str.split(',') if url.strip()]
-            api_keys = [key.strip() for key in api_keys_str.split(',') if key.strip()]
+            base_urls = [url for raw in base_urls_str.split(',') if (url := raw.strip())]
+            api_keys = [key for raw in api_keys_str.split(',') if (key := raw.strip())]
             
             # 验证URL格式
             valid_urls = [url for url in base_urls if _validate_url(url)]
@@ -94,9 +107,9 @@ providers: List[Dict[str, List[str]]] = load_providers_from_env()
 # 从环境变量获取当前供应商索引
 current_provider_index: int = int(os.getenv('CURRENT_PROVIDER_INDEX', '0'))
 
-# 每个供应商内部的URL索引计数器（用于轮询负载均衡）
-import threading
-_provider_url_counters: Dict[int, int] = {}
+# 每个供应商内部的URL轮询计数器（itertools.count 的 next() 在C层原子完成，无需加锁）
+_provider_url_counters: Dict[int, "itertools.count[int]"] = {}
+# 仅用于端点快照的写侧重建
 _counter_lock = threading.Lock()
 
 # 从环境变量获取超时配置
@@ -110,92 +123,101 @@ port: int = int(os.getenv('PORT', '8000'))
 # 从环境变量获取鉴权密钥
 auth_key: str = os.getenv('AUTH_KEY', '')
 
+def _build_expected_auth_header(key: str) -> Optional[bytes]:
+    """预先计算期望的Authorization头部，未启用鉴权时返回None"""
+    key = key.strip()
+    return f"Bearer {key}".encode() if key else None
+
+# 期望的Authorization头部（随配置加载/重载预先计算）
+expected_auth_header: Optional[bytes] = _build_expected_auth_header(auth_key)
+
 # 从环境变量获取限流配置
-rate_limit_enabled: bool = os.getenv('RATE_LIMIT_ENABLED', 'false').lower() == 'true'
+rate_limit_enabled: bool = _env_flag('RATE_LIMIT_ENABLED', 'false')
 rate_limit_requests_per_minute: int = int(os.getenv('RATE_LIMIT_RPM', '100'))
 rate_limit_burst_size: int = int(os.getenv('RATE_LIMIT_BURST', '10'))
-rate_limit_trust_proxy: bool = os.getenv('RATE_LIMIT_TRUST_PROXY', 'true').lower() == 'true'
+rate_limit_trust_proxy: bool = _env_flag('RATE_LIMIT_TRUST_PROXY', 'true')
 
 # 从环境变量获取IP阻止配置
-ip_block_enabled: bool = os.getenv('IP_BLOCK_ENABLED', 'false').lower() == 'true'
+ip_block_enabled: bool = _env_flag('IP_BLOCK_ENABLED', 'false')
 blocked_ips_file: str = os.getenv('BLOCKED_IPS_FILE', 'app/data/blocked_ips.json')
 
 # 从环境变量获取日志配置
 log_level: str = os.getenv('LOG_LEVEL', 'NONE').upper()
 log_dir: str = os.getenv('LOG_DIR', 'app/data/log')
 
+# 当前供应商的端点快照：(providers对象, 供应商索引, 端点元组)
+# 只在切换/重载时（或检测到 providers、索引被直接改写时）重建，读路径无锁
+_current_endpoint_snapshot: Tuple[Any, int, Tuple[Dict[str, str], ...]] = (None, -1, ())
+
+def _build_endpoint_snapshot(provider_list: Any, index: int) -> Tuple[Any, int, Tuple[Dict[str, str], ...]]:
+    """校验指定供应商配置并构建端点快照，配置无效时端点元组为空"""
+    endpoints: Tuple[Dict[str, str], ...] = ()
+    if provider_list and 0 <= index < len(provider_list):
+        provider = provider_list[index]
+        if isinstance(provider, dict) and "base_urls" in provider and "api_keys" in provider:
+            base_urls = provider.get("base_urls", [])
+            api_keys = provider.get("api_keys", [])
+            if (isinstance(base_urls, list) and isinstance(api_keys, list)
+                    and base_urls and len(base_urls) == len(api_keys)):
+                # 同时预先计算转发用的Authorization头部，转发时无需再拼接/编码；
+                # base_url 去掉末尾的 "/"，与以 "/" 开头的请求路径直接拼接即为完整URL
+                endpoints = tuple(
+                    {"base_url": url.rstrip("/") if isinstance(url, str) else url,
+                     "api_key": key, "auth_header": f"Bearer {key}".encode()}
+                    for url, key in zip(base_urls, api_keys)
+                )
+    return (provider_list, index, endpoints)
+
+def _get_current_endpoints() -> Tuple[Dict[str, str], ...]:
+    """无锁读取当前供应商的端点快照"""
+    global _current_endpoint_snapshot
+    snapshot = _current_endpoint_snapshot
+    if snapshot[0] is not providers or snapshot[1] != current_provider_index:
+        # providers 或索引被直接改写（如测试替换），在写侧加锁重建快照
+        with _counter_lock:
+            snapshot = _build_endpoint_snapshot(providers, current_provider_index)
+            _current_endpoint_snapshot = snapshot
+    return snapshot[2]
+
 def get_current_provider_endpoint() -> Dict[str, str]:
     """
     获取当前供应商的一个端点（使用轮询负载均衡）
-    返回单个 base_url 和 api_key 的组合
+    返回单个 base_url 和 api_key 的组合，auth_header 为预先计算好的Authorization头部（bytes）
     """
-    if not providers or current_provider_index >= len(providers):
-        return {"base_url": "", "api_key": ""}
-    
-    provider = providers[current_provider_index]
-    if not isinstance(provider, dict) or "base_urls" not in provider or "api_keys" not in provider:
-        return {"base_url": "", "api_key": ""}
+    endpoints = _get_current_endpoints()
+    if not endpoints:
+        return {"base_url": "", "api_key": "", "auth_header": b""}
     
-    base_urls = provider.get("base_urls", [])
-    api_keys = provider.get("api_keys", [])
+    # 使用轮询方式选择URL（无锁：setdefault 与 next(count) 均为原子操作）
+    counter = _provider_url_counters.get(current_provider_index)
+    if counter is None:
+        counter = _provider_url_counters.setdefault(current_provider_index, itertools.count())
     
-    if not isinstance(base_urls, list) or not isinstance(api_keys, list):
-        return {"base_url": "", "api_key": ""}
-    
-    if not base_urls or not api_keys or len(base_urls) != len(api_keys):
-        return {"base_url": "", "api_key": ""}
-    
-    # 使用轮询方式选择URL（线程安全）
-    with _counter_lock:
-        if current_provider_index not in _provider_url_counters:
-            _provider_url_counters[current_provider_index] = 0
-        
-        url_index = _provider_url_counters[current_provider_index] % len(base_urls)
-        _provider_url_counters[current_provider_index] += 1
-    
-    return {
-        "base_url": base_urls[url_index],
-        "api_key": api_keys[url_index]
-    }
+    return endpoints[next(counter) % len(endpoints)]
 
 def get_current_provider_random_endpoint() -> Dict[str, str]:
     """
     获取当前供应商的一个端点（使用随机负载均衡）
-    返回单个 base_url 和 api_key 的组合
+    返回单个 base_url 和 api_key 的组合，auth_header 为预先计算好的Authorization头部（bytes）
     """
-    if not providers or current_provider_index >= len(providers):
-        return {"base_url": "", "api_key": ""}
-    
-    provider = providers[current_provider_index]
-    if not isinstance(provider, dict) or "base_urls" not in provider or "api_keys" not in provider:
-        return {"base_url": "", "api_key": ""}
-    
-    base_urls = provider.get("base_urls", [])
-    api_keys = provider.get("api_keys", [])
-    
-    if not isinstance(base_urls, list) or not isinstance(api_keys, list):
-        return {"base_url": "", "api_key": ""}
+    endpoints = _get_current_endpoints()
+    if not endpoints:
+        return {"base_url": "", "api_key": "", "auth_header": b""}
     
-    if not base_urls or not api_keys or len(base_urls) != len(api_keys):
-        return {"base_url": "", "api_key": ""}
-    
-    # 随机选择URL
-    url_index = random.randint(0, len(base_urls) - 1)
-    
-    return {
-        "base_url": base_urls[url_index],
-        "api_key": api_keys[url_index]
-    }
+    # 随机选择URL（random.choice 直接按长度取下标，比 randint 少一层范围计算）
+    return random.choice(endpoints)
 
 def get_current_provider() -> Dict[str, str]:
     """获取当前选择的供应商（向后兼容，使用轮询负载均衡）"""
     return get_current_provider_endpoint()
 
 def set_provider_index(index: int) -> bool:
-    """设置当前供应商索引"""
-    global current_provider_index
+    """设置当前供应商索引（写侧加锁并同步重建端点快照）"""
+    global current_provider_index, _current_endpoint_snapshot
     if 0 <= index < len(providers):
-        current_provider_index = index
+        with _counter_lock:
+            current_provider_index = index
+            _current_endpoint_snapshot = _build_endpoint_snapshot(providers, index)
         return True
     return False
 
@@ -279,33 +301,48 @@ def get_log_config() -> Dict[str, Any]:
 def reload_config():
     """重新加载配置（主要用于运行时更新环境变量）"""
     global providers, current_provider_index, request_timeout, stream_timeout, host, port, auth_key, _provider_url_counters
+    global expected_auth_header
     global rate_limit_enabled, rate_limit_requests_per_minute, rate_limit_burst_size, rate_limit_trust_proxy
-    global ip_block_enabled, blocked_ips_file, log_level, log_dir
+    global ip_block_enabled, blocked_ips_file, log_level, log_dir, _current_endpoint_snapshot
+    
+    # 先把全部配置解析到局部变量：解析出错（如端口非数字）时旧配置保持完整，
+    # 成功后再集中回写模块变量，读取方看到新旧混杂状态的窗口只剩这几次赋值
+    env = os.environ
+    new_providers = load_providers_from_env()
+    new_index = int(env.get('CURRENT_PROVIDER_INDEX', '0'))
+    new_request_timeout = float(env.get('REQUEST_TIMEOUT', '60'))
+    new_stream_timeout = float(env.get('STREAM_TIMEOUT', '120'))
+    new_host = env.get('HOST', '0.0.0.0')
+    new_port = int(env.get('PORT', '8000'))
+    new_auth_key = env.get('AUTH_KEY', '')
+    new_auth_header = _build_expected_auth_header(new_auth_key)
     
-    providers = load_providers_from_env()
-    current_provider_index = int(os.getenv('CURRENT_PROVIDER_INDEX', '0'))
-    request_timeout = float(os.getenv('REQUEST_TIMEOUT', '60'))
-    stream_timeout = float(os.getenv('STREAM_TIMEOUT', '120'))
-    host = os.getenv('HOST', '0.0.0.0')
-    port = int(os.getenv('PORT', '8000'))
-    auth_key = os.getenv('AUTH_KEY', '')
+    # 限流配置
+    new_rate_limit_enabled = _env_flag('RATE_LIMIT_ENABLED', 'false')
+    new_rpm = int(env.get('RATE_LIMIT_RPM', '100'))
+    new_burst = int(env.get('RATE_LIMIT_BURST', '10'))
+    new_trust_proxy = _env_flag('RATE_LIMIT_TRUST_PROXY', 'true')
     
-    # 重新加载限流配置
-    rate_limit_enabled = os.getenv('RATE_LIMIT_ENABLED', 'false').lower() == 'true'
-    rate_limit_requests_per_minute = int(os.getenv('RATE_LIMIT_RPM', '100'))
-    rate_limit_burst_size = int(os.getenv('RATE_LIMIT_BURST', '10'))
-    rate_limit_trust_proxy = os.getenv('RATE_LIMIT_TRUST_PROXY', 'true').lower() == 'true'
+    # IP阻止配置
+    new_ip_block_enabled = _env_flag('IP_BLOCK_ENABLED', 'false')
+    new_blocked_ips_file = env.get('BLOCKED_IPS_FILE', 'app/data/blocked_ips.json')
     
-    # 重新加载IP阻止配置
-    ip_block_enabled = os.getenv('IP_BLOCK_ENABLED', 'false').lower() == 'true'
-    blocked_ips_file = os.getenv('BLOCKED_IPS_FILE', 'app/data/blocked_ips.json')
+    # 日志配置
+    new_log_level = env.get('LOG_LEVEL', 'NONE').upper()
+    new_log_dir = env.get('LOG_DIR', 'app/data/log')
     
-    # 重新加载日志配置
-    log_level = os.getenv('LOG_LEVEL', 'NONE').upper()
-    log_dir = os.getenv('LOG_DIR', 'app/data/log')
+    providers, current_provider_index = new_providers, new_index
+    request_timeout, stream_timeout = new_request_timeout, new_stream_timeout
+    host, port = new_host, new_port
+    auth_key, expected_auth_header = new_auth_key, new_auth_header
+    rate_limit_enabled, rate_limit_requests_per_minute = new_rate_limit_enabled, new_rpm
+    rate_limit_burst_size, rate_limit_trust_proxy = new_burst, new_trust_proxy
+    ip_block_enabled, blocked_ips_file = new_ip_block_enabled, new_blocked_ips_file
+    log_level, log_dir = new_log_level, new_log_dir
     
-    # 重置URL计数器
+    # 重置URL计数器和端点快照
     _provider_url_counters.clear()
+    _current_endpoint_snapshot = (None, -1, ())
 
 # 启动时打印配置信息
 if __name__ == "__main__":
@@ -327,8 +364,7 @@ if __name__ == "__main__":
     
     for i, provider in enumerate(providers):
         base_urls = provider['base_urls']
-        api_keys = provider['api_keys']
         print(f"供应商 {i}: {len(base_urls)} 个端点")
-        for j, (url, key) in enumerate(zip(base_urls, api_keys)):
-            masked_key = key[:8] + "..." if len(key) > 8 else "***"
+        for j, (url, key) in enumerate(zip(base_urls, provider['api_keys'])):
+            masked_key = f"{key[:8]}..." if len(key) > 8 else "***"
             print(f"  端点 {j}: {url} (key: {masked_key})")
\ No newline at end of file
@@ -8,8 +8,17 @@ CIL Router 测试运行器
 import sys
 import subprocess
 import argparse
+import functools
 from pathlib import Path
 
+@functools.lru_cache(maxsize=None)
+def _list_test_files(directory: Path) -> tuple:
+    """列出目录下的测试文件（按名称排序，同一进程内只扫描一次）"""
+    if not directory.is_dir():
+        return ()
+    return tuple(sorted(directory.glob("test_*.py")))
+
+
 class TestRunner:
     """测试运行器"""
     
@@ -20,53 +29,76 @@ class TestRunner:
     def run_unit_tests(self, verbose=False):
         """运行单元测试"""
         print("🧪 运行单元测试...")
-        return self._run_pytest(self.test_dir / "unit", verbose)
+        return self._run_pytest(self.test_dir / "unit", verbose=verbose)
     
     def run_integration_tests(self, verbose=False):
         """运行集成测试"""
         print("🔗 运行集成测试...")
-        return self._run_pytest(self.test_dir / "integration", verbose)
+        return self._run_pytest(self.test_dir / "integration", verbose=verbose)
     
     def run_stress_tests(self, verbose=False):
         """运行压力测试"""
         print("💪 运行压力测试...")
-        return self._run_pytest(self.test_dir / "stress", verbose)
+        return self._run_pytest(self.test_dir / "stress", verbose=verbose)
     
     def run_security_tests(self, verbose=False):
         """运行安全测试"""
         print("🛡️ 运行安全测试...")
-        return self._run_pytest(self.test_dir / "security", verbose)
+        return self._run_pytest(self.test_dir / "security", verbose=verbose)
     
     def run_performance_tests(self, verbose=False):
         """运行性能测试"""
         print("🚀 运行性能测试...")
         perf_dir = self.test_dir / "performance"
-        if not any(perf_dir.glob("test_*.py")):
+        if not _list_test_files(perf_dir):
             print("   📝 暂无性能测试文件")
             return True
-        return self._run_pytest(perf_dir, verbose)
+        return self._run_pytest(perf_dir, verbose=verbose)
     
-    def run_all_tests(self, verbose=False):
-        """运行所有测试"""
+    def run_all_tests(self, verbose=False, parallel=False):
+        """运行所有测试（parallel=True 时各测试目录在独立子进程中并发执行）"""
         print("🎯 运行所有测试...")
-        return self._run_pytest(self.test_dir, verbose)
+        if not parallel:
+            return self._run_pytest(self.test_dir, verbose=verbose)
+        
+        suites = [d for d in ("unit", "integration", "stress", "security", "performance")
+                  if _list_test_files(self.test_dir / d)]
+        try:
+            # 同时启动所有子进程，输出各自收集，结束后按顺序打印，避免交错；
+            # 并发的子进程不写共享的 .pytest_cache，避免相互覆盖
+            procs = [
+                (suite, subprocess.Popen(self._pytest_cmd(self.test_dir / suite, verbose=verbose,
+                                                          extra=("-p", "no:cacheprovider")),
+                                         cwd=self.root_dir,
+                                         stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True))
+                for suite in suites
+            ]
+        except Exception as e:
+            print(f"❌ 运行测试时出错: {e}")
+            return False
+        
+        success = True
+        for suite, proc in procs:
+            output, _ = proc.communicate()
+            print(f"\n--- {suite} ---")
+            print(output, end="")
+            success &= proc.returncode == 0
+        return success
     
     def run_quick_tests(self, verbose=False):
         """运行快速测试（单元测试 + 部分集成测试）"""
         print("⚡ 运行快速测试...")
-        success = True
-        success &= self.run_unit_tests(verbose)
-        
-        # 运行关键的集成测试
+        # 单元测试与关键集成测试合并为一次pytest调用，只付一次解释器和pytest启动开销
         key_integration_tests = [
             "test_final_integration.py"
         ]
+        paths = [self.test_dir / "unit"]
         for test_file in key_integration_tests:
             test_path = self.test_dir / "integration" / test_file
             if test_path.exists():
-                success &= self._run_pytest(test_path, verbose)
+                paths.append(test_path)
         
-        return success
+        return self._run_pytest(*paths, verbose=verbose)
     
     def generate_report(self):
         """生成测试报告"""
@@ -94,19 +126,22 @@ class TestRunner:
             print("⚠️ 测试报告生成器不存在")
             return False
     
-    def _run_pytest(self, path, verbose=False):
-        """运行pytest"""
-        cmd = [sys.executable, "-m", "pytest", str(path)]
+    def _pytest_cmd(self, *paths, verbose=False, extra=()):
+        """构造pytest命令行（extra 为追加的额外参数）"""
+        cmd = [sys.executable, "-m", "pytest", *map(str, paths)]
         
         if verbose:
             cmd.append("-v")
         else:
             cmd.append("-q")
         
-        cmd.extend(["--tb=short", "--no-header"])
-        
+        cmd.extend(["--tb=short", "--no-header", *extra])
+        return cmd
+    
+    def _run_pytest(self, *paths, verbose=False):
+        """运行pytest（多个路径在同一个子进程中执行）"""
         try:
-            result = subprocess.run(cmd, cwd=self.root_dir)
+            result = subprocess.run(self._pytest_cmd(*paths, verbose=verbose), cwd=self.root_dir)
             return result.returncode == 0
         except Exception as e:
             print(f"❌ 运行测试时出错: {e}")
@@ -127,10 +162,10 @@ class TestRunner:
         for category, title in categories:
             cat_dir = self.test_dir / category
             if cat_dir.exists():
-                test_files = list(cat_dir.glob("test_*.py"))
+                test_files = _list_test_files(cat_dir)
                 if test_files:
                     print(f"\n{title}:")
-                    for test_file in sorted(test_files):
+                    for test_file in test_files:
                         print(f"   - {test_file.name}")
                 else:
                     print(f"\n{title}: 📝 暂无测试文件")
@@ -174,6 +209,7 @@ def main():
         "all", "quick", "report", "list", "check"
     ], help="测试动作")
     parser.add_argument("-v", "--verbose", action="store_true", help="详细输出")
+    parser.add_argument("-j", "--parallel", action="store_true", help="all 动作下各测试目录并发执行")
     
     args = parser.parse_args()
     
@@ -198,7 +234,7 @@ def main():
     elif args.action == "performance":
         success = runner.run_performance_tests(args.verbose)
     elif args.action == "all":
-        success = runner.run_all_tests(args.verbose)
+        success = runner.run_all_tests(args.verbose, args.parallel)
     elif args.action == "quick":
         success = runner.run_quick_tests(args.verbose)
     elif args.action == "report":
@@ -9,24 +9,67 @@ import pytest
 import asyncio
 import json
 import time
-import tempfile
-from pathlib import Path
+import logging
+from concurrent.futures import ThreadPoolExecutor
 from unittest.mock import patch, Mock, AsyncMock
 from fastapi.testclient import TestClient
 from fastapi import HTTPException
 import httpx
 
-from app.main import app, _handle_normal_request_with_retry_and_body
+from app.main import app
+from app.utils.logger import CILRouterLogger, _stop_queue_listener
 from app.middleware.rate_limiter import RateLimiter, RateLimitMiddleware
 import config.config as config
 
-client = TestClient(app)
+# 大请求体只在模块加载时构造一次，测试中直接以原始字节发送，不再逐次 json 序列化
+_JSON_HEADERS = {"content-type": "application/json"}
+_LARGE_BODY = b'{"data": "' + b'x' * (1024 * 1024) + b'"}'  # 1MB
+_MEMORY_PRESSURE_BODY = b'{"large_field": "' + b'x' * 10000 + b'"}'
+
+# 错误详情中应出现的关键词（任一即可）
+_CONNECTION_ERROR_KEYWORDS = ("error", "连接", "失败", "endpoint")
+_TIMEOUT_ERROR_KEYWORDS = ("timeout", "超时", "失败", "endpoint")
+
+
+@pytest.fixture(scope="module")
+def client():
+    """模块共享的测试客户端（以上下文管理器运行，lifespan 与事件循环只启动一次）"""
+    with TestClient(app) as c:
+        yield c
+
+
+@pytest.fixture(scope="module")
+def thread_pool():
+    """模块共享的线程池，并发测试复用工作线程而不是每个请求新建线程"""
+    with ThreadPoolExecutor(max_workers=50) as pool:
+        yield pool
+
+
+def _close_cilrouter_logger():
+    """关闭 cilrouter 日志记录器的文件处理器和后台队列监听器"""
+    logger = logging.getLogger("cilrouter")
+    for handler in list(logger.handlers):
+        handler.close()
+        logger.removeHandler(handler)
+    _stop_queue_listener()
+
+
+@pytest.fixture
+def tmp_logger(tmp_path):
+    """写入临时目录的ERROR级日志记录器，测试结束后释放处理器"""
+    yield CILRouterLogger(log_level="ERROR", log_dir=str(tmp_path))
+    _close_cilrouter_logger()
+
+
+def _upstream_response(status_code=200, content=b'{}', headers=None):
+    """构造上游响应（非流式转发通过 AsyncClient.send 以流方式读取原始字节）"""
+    return httpx.Response(status_code, headers=headers or {}, stream=httpx.ByteStream(content))
 
 class TestNetworkErrorHandling:
     """网络错误处理测试"""
     
-    @patch('httpx.AsyncClient.request')
-    def test_connection_error_handling(self, mock_request):
+    @patch('httpx.AsyncClient.send')
+    def test_connection_error_handling(self, mock_request, client):
         """测试连接错误处理"""
         # 模拟连接错误
         mock_request.side_effect = httpx.ConnectError("连接被拒绝")
@@ -35,12 +78,12 @@ class TestNetworkErrorHandling:
         
         # 应该返回502或500状态码
         assert response.status_code in [502, 500]
-        detail = response.json()["detail"]
+        detail = response.json()["detail"].lower()
         # 检查是否包含错误相关信息
-        assert any(keyword in detail.lower() for keyword in ["error", "连接", "失败", "endpoint"])
+        assert any(keyword in detail for keyword in _CONNECTION_ERROR_KEYWORDS)
     
-    @patch('httpx.AsyncClient.request')
-    def test_timeout_error_handling(self, mock_request):
+    @patch('httpx.AsyncClient.send')
+    def test_timeout_error_handling(self, mock_request, client):
         """测试超时错误处理"""
         # 模拟超时错误
         mock_request.side_effect = httpx.TimeoutException("请求超时")
@@ -49,38 +92,34 @@ class TestNetworkErrorHandling:
         
         assert response.status_code in [502, 500]
         error_detail = response.json()["detail"].lower()
-        assert any(keyword in error_detail for keyword in ["timeout", "超时", "失败", "endpoint"])
+        assert any(keyword in error_detail for keyword in _TIMEOUT_ERROR_KEYWORDS)
     
-    @patch('httpx.AsyncClient.request')
-    def test_http_status_error_handling(self, mock_request):
+    # 模拟各种HTTP错误状态
+    @pytest.mark.parametrize("status_code,reason", [
+        (400, "Bad Request"),
+        (401, "Unauthorized"),
+        (403, "Forbidden"),
+        (404, "Not Found"),
+        (500, "Internal Server Error"),
+        (502, "Bad Gateway"),
+        (503, "Service Unavailable")
+    ])
+    @patch('httpx.AsyncClient.send')
+    def test_http_status_error_handling(self, mock_request, client, status_code, reason):
         """测试HTTP状态错误处理"""
-        # 模拟各种HTTP错误状态
-        error_responses = [
-            (400, "Bad Request"),
-            (401, "Unauthorized"),
-            (403, "Forbidden"),
-            (404, "Not Found"),
-            (500, "Internal Server Error"),
-            (502, "Bad Gateway"),
-            (503, "Service Unavailable")
-        ]
+        mock_request.return_value = _upstream_response(
+            status_code,
+            content=json.dumps({"error": reason}).encode(),
+            headers={"content-type": "application/json"}
+        )
         
-        for status_code, reason in error_responses:
-            mock_response = Mock()
-            mock_response.status_code = status_code
-            mock_response.headers = {"content-type": "application/json"}
-            mock_response.content = json.dumps({"error": reason}).encode()
-            mock_response.text = json.dumps({"error": reason})
-            
-            mock_request.return_value = mock_response
-            
-            response = client.post("/api/test", json={"test": "error"})
-            
-            # 应该透明转发状态码
-            assert response.status_code == status_code
+        response = client.post("/api/test", json={"test": "error"})
+        
+        # 应该透明转发状态码
+        assert response.status_code == status_code
     
-    @patch('httpx.AsyncClient.request')
-    def test_network_instability_simulation(self, mock_request):
+    @patch('httpx.AsyncClient.send')
+    def test_network_instability_simulation(self, mock_request, client):
         """测试网络不稳定模拟"""
         # 模拟间歇性网络故障
         call_count = 0
@@ -91,11 +130,7 @@ class TestNetworkErrorHandling:
             if call_count % 3 == 0:  # 每三次调用失败一次
                 raise httpx.ConnectError("间歇性连接失败")
             
-            mock_response = Mock()
-            mock_response.status_code = 200
-            mock_response.headers = {}
-            mock_response.content = b'{"success": true}'
-            return mock_response
+            return _upstream_response(content=b'{"success": true}')
         
         mock_request.side_effect = intermittent_failure
         
@@ -116,32 +151,26 @@ class TestNetworkErrorHandling:
 class TestProviderFailoverAndRetry:
     """供应商故障转移和重试测试"""
     
-    def test_provider_configuration_validation(self):
+    def test_provider_configuration_validation(self, monkeypatch):
         """测试供应商配置验证"""
-        original_providers = config.providers
-        
-        try:
-            # 测试空供应商列表
-            with patch.object(config, 'providers', []):
-                provider = config.get_current_provider_endpoint()
-                assert provider["base_url"] == ""
-                assert provider["api_key"] == ""
-            
-            # 测试无效供应商配置
-            invalid_providers = [
-                {"base_urls": [], "api_keys": []},
-                {"base_urls": [""], "api_keys": [""]}
-            ]
-            
-            for invalid_provider in invalid_providers:
-                with patch.object(config, 'providers', [invalid_provider]):
-                    provider = config.get_current_provider_endpoint()
-                    assert provider["base_url"] == "" or provider["api_key"] == ""
+        # 测试空供应商列表
+        monkeypatch.setattr(config, 'providers', [])
+        provider = config.get_current_provider_endpoint()
+        assert provider["base_url"] == ""
+        assert provider["api_key"] == ""
+        
+        # 测试无效供应商配置
+        invalid_providers = [
+            {"base_urls": [], "api_keys": []},
+            {"base_urls": [""], "api_keys": [""]}
+        ]
         
-        finally:
-            config.providers = original_providers
+        for invalid_provider in invalid_providers:
+            monkeypatch.setattr(config, 'providers', [invalid_provider])
+            provider = config.get_current_provider_endpoint()
+            assert provider["base_url"] == "" or provider["api_key"] == ""
     
-    def test_load_balancing_with_failed_endpoints(self):
+    def test_load_balancing_with_failed_endpoints(self, monkeypatch):
         """测试端点故障时的负载均衡"""
         # 模拟多端点供应商配置
         test_providers = [{
@@ -149,116 +178,98 @@ class TestProviderFailoverAndRetry:
             "api_keys": ["key1", "key2", "key3"]
         }]
         
-        original_providers = config.providers
-        original_index = config.current_provider_index
+        monkeypatch.setattr(config, 'providers', test_providers)
+        monkeypatch.setattr(config, 'current_provider_index', 0)
+        # 轮询计数器是模块级状态，前面的测试可能已推进过，这里从头开始
+        monkeypatch.setattr(config, '_provider_url_counters', {})
         
-        try:
-            with patch.object(config, 'providers', test_providers):
-                with patch.object(config, 'current_provider_index', 0):
-                    # 获取多个端点，应该轮询
-                    endpoints = []
-                    for i in range(6):  # 获取两轮
-                        endpoint = config.get_current_provider_endpoint()
-                        endpoints.append(endpoint["base_url"])
-                    
-                    # 应该按顺序轮询
-                    expected_pattern = test_providers[0]["base_urls"] * 2
-                    assert endpoints == expected_pattern
+        # 获取多个端点，应该轮询
+        endpoints = []
+        for i in range(6):  # 获取两轮
+            endpoint = config.get_current_provider_endpoint()
+            endpoints.append(endpoint["base_url"])
         
-        finally:
-            config.providers = original_providers
-            config.current_provider_index = original_index
+        # 应该按顺序轮询
+        expected_pattern = test_providers[0]["base_urls"] * 2
+        assert endpoints == expected_pattern
     
-    def test_provider_switching_robustness(self):
+    def test_provider_switching_robustness(self, monkeypatch):
         """测试供应商切换的健壮性"""
-        original_index = config.current_provider_index
+        # 记录当前索引，测试结束时由 monkeypatch 恢复
+        monkeypatch.setattr(config, 'current_provider_index', config.current_provider_index)
         provider_count = config.get_provider_count()
         
-        try:
-            # 测试边界值切换
-            test_cases = [
-                (0, True),
-                (provider_count - 1, True),
-                (-1, False),
-                (provider_count, False),
-                (999, False)
-            ]
-            
-            for index, should_succeed in test_cases:
-                result = config.set_provider_index(index)
-                assert result == should_succeed
-                
-                if should_succeed:
-                    assert config.current_provider_index == index
+        # 测试边界值切换
+        test_cases = [
+            (0, True),
+            (provider_count - 1, True),
+            (-1, False),
+            (provider_count, False),
+            (999, False)
+        ]
         
-        finally:
-            config.set_provider_index(original_index)
+        for index, should_succeed in test_cases:
+            result = config.set_provider_index(index)
+            assert result == should_succeed
+            
+            if should_succeed:
+                assert config.current_provider_index == index
 
 
 class TestRequestProcessingErrors:
     """请求处理错误测试"""
     
-    def test_malformed_request_handling(self):
+    # 测试各种畸形请求
+    @pytest.mark.parametrize("headers,body", [
+        ({"content_type": "application/json"}, b'{"incomplete": '),
+        ({"content_type": "application/json"}, b'invalid json'),
+        ({"content_type": "application/xml"}, b'<incomplete><xml>'),
+        ({}, b'\x00\x01\x02\x03'),  # 二进制数据
+    ])
+    def test_malformed_request_handling(self, client, headers, body):
         """测试畸形请求处理"""
-        # 测试各种畸形请求
-        malformed_requests = [
-            ({"content_type": "application/json"}, b'{"incomplete": '),
-            ({"content_type": "application/json"}, b'invalid json'),
-            ({"content_type": "application/xml"}, b'<incomplete><xml>'),
-            ({}, b'\x00\x01\x02\x03'),  # 二进制数据
-        ]
-        
-        for headers, body in malformed_requests:
-            response = client.post("/api/test", headers=headers, content=body)
-            # 应该返回错误但不崩溃
-            assert response.status_code in [400, 422, 502, 500]
+        response = client.post("/api/test", headers=headers, content=body)
+        # 应该返回错误但不崩溃
+        assert response.status_code in [400, 422, 502, 500]
     
-    def test_oversized_request_handling(self):
+    def test_oversized_request_handling(self, client):
         """测试超大请求处理"""
-        # 创建大请求（1MB）
-        large_data = {"data": "x" * (1024 * 1024)}
-        
         try:
-            response = client.post("/api/test", json=large_data, timeout=30)
+            # 大请求（1MB）
+            response = client.post("/api/test", content=_LARGE_BODY, headers=_JSON_HEADERS, timeout=30)
             # 应该能处理或优雅拒绝
             assert response.status_code in [200, 413, 502, 500]
         except Exception as e:
             # 如果抛出异常，应该是合理的异常
             assert "timeout" in str(e).lower() or "size" in str(e).lower()
     
-    def test_concurrent_error_scenarios(self):
+    def test_concurrent_error_scenarios(self, client, thread_pool):
         """测试并发错误场景"""
-        import threading
         import random
         
         results = []
         errors = []
         
         def make_problematic_request(request_id):
-            try:
-                # 随机选择不同类型的问题请求
-                problem_types = [
-                    lambda: client.post("/select", content="invalid"),
-                    lambda: client.post("/api/test", json={"test": "x" * 10000}),
-                    lambda: client.get("/nonexistent/path"),
-                ]
-                
-                problem_request = random.choice(problem_types)
-                response = problem_request()
-                results.append((request_id, response.status_code))
-            except Exception as e:
-                errors.append((request_id, str(e)))
+            # 随机选择不同类型的问题请求
+            problem_types = [
+                lambda: client.post("/select", content="invalid"),
+                lambda: client.post("/api/test", json={"test": "x" * 10000}),
+                lambda: client.get("/nonexistent/path"),
+            ]
+            
+            problem_request = random.choice(problem_types)
+            return problem_request().status_code
         
         # 创建并发问题请求
-        threads = []
-        for i in range(20):
-            thread = threading.Thread(target=make_problematic_request, args=(i,))
-            threads.append(thread)
-            thread.start()
+        futures = [thread_pool.submit(make_problematic_request, i) for i in range(20)]
         
-        # 等待所有线程完成
-        for thread in threads:
-            thread.join()
+        # 等待所有请求完成，结果与异常由 future 带回，无需线程间共享列表
+        for request_id, future in enumerate(futures):
+            try:
+                results.append((request_id, future.result()))
+            except Exception as e:
+                errors.append((request_id, str(e)))
         
         # 系统应该能处理所有请求而不崩溃
         assert len(results) + len(errors) == 20
@@ -272,121 +283,95 @@ class TestRequestProcessingErrors:
 class TestSystemResourceHandling:
     """系统资源处理测试"""
     
-    def test_memory_pressure_simulation(self):
+    def test_memory_pressure_simulation(self, client, thread_pool):
         """测试内存压力模拟"""
         # 创建大量并发请求来模拟内存压力
-        import threading
-        
-        def memory_intensive_request():
-            # 创建包含大量数据的请求
-            data = {"large_field": "x" * 10000}
-            response = client.post("/api/test", json=data)
+        def memory_intensive_request(_):
+            # 包含大量数据的请求
+            response = client.post("/api/test", content=_MEMORY_PRESSURE_BODY, headers=_JSON_HEADERS)
             return response.status_code
         
-        # 快速创建大量线程
-        threads = []
-        for i in range(50):
-            thread = threading.Thread(target=memory_intensive_request)
-            threads.append(thread)
-            thread.start()
-        
-        # 等待完成
-        for thread in threads:
-            thread.join()
+        # 并发提交大量请求并等待完成
+        list(thread_pool.map(memory_intensive_request, range(50)))
         
         # 系统应该仍然可以响应
         response = client.get("/")
         assert response.status_code == 200
     
-    def test_file_system_error_handling(self):
+    def test_file_system_error_handling(self, tmp_path):
         """测试文件系统错误处理"""
         # 测试日志文件权限问题
-        with tempfile.TemporaryDirectory() as temp_dir:
-            log_dir = Path(temp_dir) / "logs"
-            log_dir.mkdir()
+        log_dir = tmp_path / "logs"
+        log_dir.mkdir()
+        
+        # 创建只读日志目录
+        log_dir.chmod(0o444)
+        
+        try:
+            # 尝试在只读目录创建日志
+            logger = CILRouterLogger(log_level="DEBUG", log_dir=str(log_dir))
             
-            # 创建只读日志目录
-            log_dir.chmod(0o444)
+            # 应该能处理权限错误而不崩溃
+            logger.info("测试日志")
             
+        except PermissionError:
+            # 预期的权限错误
+            pass
+        except Exception as e:
+            # 其他异常应该被合理处理
+            assert "permission" in str(e).lower() or "access" in str(e).lower()
+        
+        finally:
+            _close_cilrouter_logger()
+            # 恢复权限以便清理
             try:
-                from app.utils.logger import CILRouterLogger
-                
-                # 尝试在只读目录创建日志
-                logger = CILRouterLogger(log_level="DEBUG", log_dir=str(log_dir))
-                
-                # 应该能处理权限错误而不崩溃
-                logger.info("测试日志")
-                
-            except PermissionError:
-                # 预期的权限错误
+                log_dir.chmod(0o755)
+            except:
                 pass
-            except Exception as e:
-                # 其他异常应该被合理处理
-                assert "permission" in str(e).lower() or "access" in str(e).lower()
-            
-            finally:
-                # 恢复权限以便清理
-                try:
-                    log_dir.chmod(0o755)
-                except:
-                    pass
 
 
 class TestConfigurationErrorHandling:
     """配置错误处理测试"""
     
-    def test_missing_configuration_handling(self):
+    def test_missing_configuration_handling(self, client, monkeypatch):
         """测试缺失配置处理"""
-        # 备份原始配置
-        original_providers = config.providers
+        # 模拟配置丢失
+        monkeypatch.setattr(config, 'providers', None)
         
+        # 系统应该能处理None配置
         try:
-            # 模拟配置丢失
-            with patch.object(config, 'providers', None):
-                # 系统应该能处理None配置
-                try:
-                    response = client.get("/")
-                    # 可能返回错误，但不应该崩溃
-                    assert response.status_code in [200, 500, 503]
-                except Exception as e:
-                    # 如果抛出异常，应该是配置相关的
-                    assert "config" in str(e).lower() or "provider" in str(e).lower()
-        
-        finally:
-            config.providers = original_providers
+            response = client.get("/")
+            # 可能返回错误，但不应该崩溃
+            assert response.status_code in [200, 500, 503]
+        except Exception as e:
+            # 如果抛出异常，应该是配置相关的
+            assert "config" in str(e).lower() or "provider" in str(e).lower()
     
-    def test_corrupted_configuration_handling(self):
+    # 模拟各种损坏的配置
+    @pytest.mark.parametrize("corrupted_config", [
+        [],  # 空列表
+        [{}],  # 空字典
+        [{"invalid": "config"}],  # 缺少必需字段
+        [{"base_urls": None, "api_keys": None}],  # None值
+        [{"base_urls": "not_a_list", "api_keys": "not_a_list"}],  # 错误类型
+    ])
+    def test_corrupted_configuration_handling(self, corrupted_config, monkeypatch):
         """测试损坏配置处理"""
-        # 模拟各种损坏的配置
-        corrupted_configs = [
-            [],  # 空列表
-            [{}],  # 空字典
-            [{"invalid": "config"}],  # 缺少必需字段
-            [{"base_urls": None, "api_keys": None}],  # None值
-            [{"base_urls": "not_a_list", "api_keys": "not_a_list"}],  # 错误类型
-        ]
+        monkeypatch.setattr(config, 'providers', corrupted_config)
         
-        original_providers = config.providers
+        # 尝试获取供应商信息
+        provider = config.get_current_provider_endpoint()
         
-        for corrupted_config in corrupted_configs:
-            try:
-                with patch.object(config, 'providers', corrupted_config):
-                    # 尝试获取供应商信息
-                    provider = config.get_current_provider_endpoint()
-                    
-                    # 应该返回安全的默认值
-                    assert isinstance(provider, dict)
-                    assert "base_url" in provider
-                    assert "api_key" in provider
-            
-            finally:
-                config.providers = original_providers
+        # 应该返回安全的默认值
+        assert isinstance(provider, dict)
+        assert "base_url" in provider
+        assert "api_key" in provider
 
 
 class TestErrorRecoveryAndGracefulDegradation:
     """错误恢复和优雅降级测试"""
     
-    def test_service_recovery_after_failure(self):
+    def test_service_recovery_after_failure(self, client):
         """测试故障后的服务恢复"""
         # 模拟服务故障然后恢复
         call_count = 0
@@ -400,13 +385,9 @@ class TestErrorRecoveryAndGracefulDegradation:
                 raise httpx.ConnectError("服务暂时不可用")
             else:
                 # 之后的调用成功
-                mock_response = Mock()
-                mock_response.status_code = 200
-                mock_response.headers = {}
-                mock_response.content = b'{"recovered": true}'
-                return mock_response
+                return _upstream_response(content=b'{"recovered": true}')
         
-        with patch('httpx.AsyncClient.request', side_effect=failing_then_recovering):
+        with patch('httpx.AsyncClient.send', side_effect=failing_then_recovering):
             # 前几个请求应该失败
             for i in range(3):
                 response = client.post("/api/test", json={"test": f"request_{i}"})
@@ -416,38 +397,22 @@ class TestErrorRecoveryAndGracefulDegradation:
             response = client.post("/api/test", json={"test": "recovery_test"})
             assert response.status_code == 200
     
-    def test_graceful_degradation_under_load(self):
+    def test_graceful_degradation_under_load(self, client, thread_pool):
         """测试负载下的优雅降级"""
-        # 模拟高负载情况
-        def slow_response(*args, **kwargs):
-            time.sleep(0.1)  # 模拟慢响应
-            mock_response = Mock()
-            mock_response.status_code = 200
-            mock_response.headers = {}
-            mock_response.content = b'{"slow": true}'
-            return mock_response
-        
-        with patch('httpx.AsyncClient.request', side_effect=slow_response):
-            import threading
-            
-            response_times = []
-            
-            def timed_request():
+        # 模拟高负载情况（异步等待，不阻塞事件循环，并发请求的延迟可以重叠）
+        async def slow_response(*args, **kwargs):
+            await asyncio.sleep(0.1)  # 模拟慢响应
+            return _upstream_response(content=b'{"slow": true}')
+        
+        with patch('httpx.AsyncClient.send', side_effect=slow_response):
+            def timed_request(_):
                 start_time = time.time()
                 response = client.post("/api/test", json={"load_test": True})
                 end_time = time.time()
-                response_times.append((end_time - start_time, response.status_code))
+                return end_time - start_time, response.status_code
             
-            # 创建并发请求
-            threads = []
-            for i in range(10):
-                thread = threading.Thread(target=timed_request)
-                threads.append(thread)
-                thread.start()
-            
-            # 等待完成
-            for thread in threads:
-                thread.join()
+            # 创建并发请求并等待完成
+            response_times = list(thread_pool.map(timed_request, range(10)))
             
             # 检查结果
             assert len(response_times) == 10
@@ -460,32 +425,28 @@ class TestErrorRecoveryAndGracefulDegradation:
 class TestErrorLoggingAndMonitoring:
     """错误记录和监控测试"""
     
-    def test_error_logging_completeness(self):
+    def test_error_logging_completeness(self, tmp_logger, tmp_path):
         """测试错误日志完整性"""
-        with tempfile.TemporaryDirectory() as temp_dir:
-            from app.utils.logger import CILRouterLogger
-            
-            logger = CILRouterLogger(log_level="ERROR", log_dir=temp_dir)
-            log_file = Path(temp_dir) / "cilrouter.log"
-            
-            # 记录各种类型的错误
-            error_types = [
-                ("network_error", "连接失败", {"host": "api.test.com"}),
-                ("config_error", "配置无效", {"config_section": "providers"}),
-                ("validation_error", "数据验证失败", {"field": "provider_index"}),
-                ("system_error", "系统资源不足", {"memory_usage": "95%"})
-            ]
-            
-            for error_type, message, details in error_types:
-                logger.log_error(error_type, message, details)
+        log_file = tmp_path / "cilrouter.log"
+        
+        # 记录各种类型的错误
+        error_types = [
+            ("network_error", "连接失败", {"host": "api.test.com"}),
+            ("config_error", "配置无效", {"config_section": "providers"}),
+            ("validation_error", "数据验证失败", {"field": "provider_index"}),
+            ("system_error", "系统资源不足", {"memory_usage": "95%"})
+        ]
+        
+        for error_type, message, details in error_types:
+            tmp_logger.log_error(error_type, message, details)
+        
+        # 检查日志文件
+        if log_file.exists():
+            log_content = log_file.read_text()
             
-            # 检查日志文件
-            if log_file.exists():
-                log_content = log_file.read_text()
-                
-                for error_type, message, _ in error_types:
-                    assert error_type in log_content, f"缺少错误类型: {error_type}"
-                    assert message in log_content, f"缺少错误消息: {message}"
+            for error_type, message, _ in error_types:
+                assert error_type in log_content, f"缺少错误类型: {error_type}"
+                assert message in log_content, f"缺少错误消息: {message}"
     
     def test_error_metrics_collection(self):
         """测试错误指标收集"""
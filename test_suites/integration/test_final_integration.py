@@ -101,7 +101,14 @@ class TestEnvironmentVariableConfiguration:
             
             assert config.is_auth_enabled() is True
             assert config.get_auth_key() == 'secret-auth-key-123'
-    
+            assert config.expected_auth_header == b'Bearer secret-auth-key-123'
+
+            # 缺少或错误的token应被静默拒绝
+            assert client.get("/v1/models").status_code == 403
+            response = client.get("/v1/models", headers={"Authorization": "Bearer wrong-key"})
+            assert response.status_code == 403
+            assert response.content == b""
+
     def test_logging_configuration_from_env(self):
         """测试日志配置"""
         test_env = {
@@ -340,6 +347,17 @@ class TestConfigurationValidation:
                     # 预期的配置错误
                     assert len(str(e)) > 0
     
+    def test_failed_reload_keeps_previous_config(self):
+        """测试重载解析失败时保留原有配置"""
+        with patch.dict(os.environ, {'HOST': '127.0.0.1', 'PORT': '9000'}):
+            config.reload_config()
+        with patch.dict(os.environ, {'HOST': '10.0.0.1', 'PORT': 'invalid_port'}):
+            with pytest.raises(ValueError):
+                config.reload_config()
+            # 解析失败前的新值也不应被部分写入
+            assert config.get_server_config() == {"host": '127.0.0.1', "port": 9000}
+        config.reload_config()
+    
     def test_configuration_consistency(self):
         """测试配置一致性"""
         # 确保配置项之间的逻辑关系正确
@@ -331,7 +331,7 @@ class TestConfigurationEdgeCases:
 class TestErrorRecoveryAndFailover:
     """错误恢复和故障转移测试"""
     
-    @patch('httpx.AsyncClient.request')
+    @patch('httpx.AsyncClient.send')
     def test_request_timeout_handling(self, mock_request):
         """测试请求超时处理"""
         import httpx
@@ -343,7 +343,7 @@ class TestErrorRecoveryAndFailover:
         response = client.post("/test_path", json={"test": "data"})
         assert response.status_code in [502, 500]  # 应该返回错误状态码
     
-    @patch('httpx.AsyncClient.request')
+    @patch('httpx.AsyncClient.send')
     def test_network_error_handling(self, mock_request):
         """测试网络错误处理"""
         import httpx
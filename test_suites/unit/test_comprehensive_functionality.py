@@ -14,6 +14,7 @@ import threading
 import tempfile
 import os
 import shutil
+import logging
 from pathlib import Path
 from unittest.mock import patch, Mock, AsyncMock
 from fastapi.testclient import TestClient
@@ -407,7 +408,25 @@ class TestLoggerModule:
                 assert "info消息" not in content
                 assert "warning消息" in content
                 assert "error消息" in content
-    
+
+    def test_logger_skips_payload_below_level(self):
+        """测试未达到日志等级时不构造日志数据"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            logger = CILRouterLogger(log_level="WARNING", log_dir=temp_dir)
+
+            assert logger.is_enabled_for(logging.WARNING) is True
+            assert logger.is_enabled_for(logging.DEBUG) is False
+
+            # DEBUG级别的结构化日志应在构造数据前直接返回
+            with patch.object(logger, "_log_with_data") as mock_log:
+                logger.log_forward_response(200, {"content-type": "application/json"}, b'{"ok": true}')
+                logger.log_rate_limit("1.2.3.4", True)
+                mock_log.assert_not_called()
+
+                # 被限流属于WARNING级别，仍然记录
+                logger.log_rate_limit("1.2.3.4", False)
+                mock_log.assert_called_once()
+
     def test_logger_structured_logging(self):
         """测试结构化日志"""
         with tempfile.TemporaryDirectory() as temp_dir:
@@ -523,6 +542,79 @@ class TestErrorHandlingAndEdgeCases:
                 assert "uvicorn" not in header_value
                 assert "fastapi" not in header_value
     
+    def test_forward_header_filtering(self):
+        """测试转发前的原始请求头清洗"""
+        from app.main import _filter_raw_headers
+
+        raw_headers = [
+            (b"host", b"localhost"),
+            (b"content-length", b"12"),
+            (b"authorization", b"Bearer client-key"),
+            (b"x-api-key", b"client-key"),
+            (b"accept-encoding", b"gzip"),
+            (b"content-type", b"application/json"),
+            (b"anthropic-version", b"2023-06-01"),
+        ]
+
+        filtered = _filter_raw_headers(raw_headers)
+        assert filtered == [
+            (b"content-type", b"application/json"),
+            (b"anthropic-version", b"2023-06-01"),
+        ]
+        # 原列表不应被修改
+        assert len(raw_headers) == 7
+
+    def test_response_header_filtering(self):
+        """测试上游响应头清洗（头名统一小写，保留重复头）"""
+        from app.main import _filter_response_headers
+
+        raw_headers = [
+            (b"Content-Type", b"application/json"),
+            (b"Content-Length", b"12"),
+            (b"Transfer-Encoding", b"chunked"),
+            (b"Content-Encoding", b"gzip"),
+            (b"Set-Cookie", b"a=1"),
+            (b"Set-Cookie", b"b=2"),
+            (b"Access-Control-Allow-Origin", b"https://example.com"),
+        ]
+
+        assert _filter_response_headers(raw_headers) == [
+            (b"content-type", b"application/json"),
+            (b"content-encoding", b"gzip"),
+            (b"set-cookie", b"a=1"),
+            (b"set-cookie", b"b=2"),
+        ]
+
+    def test_compressed_response_passthrough(self, capsys):
+        """测试普通请求的压缩响应体原样透传"""
+        import gzip
+        import httpx
+
+        payload = gzip.compress(b'{"ok": true}')
+        seen = {}
+
+        class RawStream(httpx.AsyncByteStream):
+            async def __aiter__(self):
+                yield payload
+
+        async def fake_send(self, request, **kwargs):
+            seen["accept-encoding"] = request.headers.get("accept-encoding")
+            return httpx.Response(
+                200, stream=RawStream(), request=request,
+                headers={"content-encoding": "gzip", "content-type": "application/json"}
+            )
+
+        # 未启用日志时走控制台输出，压缩的响应体只打印占位而不是解码乱码
+        with patch.object(httpx.AsyncClient, "send", fake_send), patch("app.main.get_logger", return_value=None):
+            response = client.post("/v1/messages", json={"a": 1}, headers={"Accept-Encoding": "gzip"})
+
+        assert f"<compressed {len(payload)} bytes>" in capsys.readouterr().out
+        assert seen["accept-encoding"] == "gzip"
+        assert response.status_code == 200
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.headers["content-length"] == str(len(payload))
+        assert response.json() == {"ok": True}
+
     def test_path_traversal_protection(self):
         """测试路径遍历攻击保护"""
         # 使用模拟路径而不是实际可能触发外部服务器问题的路径
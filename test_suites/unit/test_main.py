@@ -36,4 +36,52 @@ def test_select_invalid_provider():
     # Try to select an invalid provider (beyond available range)
     invalid_index = provider_count + 10
     response = client.post("/select", content=str(invalid_index))
-    assert response.status_code == 400
\ No newline at end of file
+    assert response.status_code == 400
+
+
+def test_upstream_client_without_lifespan_is_closed_after_use():
+    """Test upstream clients used on a loop without lifespan are closed right after the request"""
+    import asyncio
+    from app import main
+
+    async def use_client():
+        async with main._upstream_client("https://lazy.example.com") as upstream:
+            assert not upstream.is_closed
+        return upstream
+
+    upstream = asyncio.run(use_client())
+    assert upstream.is_closed
+
+
+def test_upstream_clients_reused_within_lifespan():
+    """Test upstream clients are reused on the lifespan loop and closed at shutdown"""
+    import asyncio
+    from app import main
+
+    async def run_lifespan():
+        async with main.lifespan(app):
+            async with main._upstream_client("https://reload.example.com") as first:
+                pass
+            async with main._upstream_client("https://reload.example.com") as second:
+                assert second is first
+                assert not first.is_closed
+        return first
+
+    upstream = asyncio.run(run_lifespan())
+    assert upstream.is_closed
+    assert app.state.upstream_loop is None
+
+
+def test_upstream_client_honours_proxy_env(monkeypatch):
+    """Test upstream clients route through HTTPS_PROXY and skip hosts listed in NO_PROXY"""
+    import httpx
+    from app import main
+
+    for name in ("ALL_PROXY", "all_proxy", "HTTP_PROXY", "http_proxy", "https_proxy", "no_proxy"):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv("HTTPS_PROXY", "http://proxy.example.com:3128")
+    monkeypatch.setenv("NO_PROXY", "internal.example.com")
+
+    upstream = main._new_upstream_client("https://api.example.com")
+    assert upstream._transport_for_url(httpx.URL("https://api.example.com/v1/messages")) is not upstream._transport
+    assert upstream._transport_for_url(httpx.URL("https://internal.example.com/v1/messages")) is upstream._transport
@@ -44,6 +44,24 @@ class TestTokenBucketAlgorithm:
         assert status["capacity"] == 10
         assert status["tokens"] == 9.0  # 消耗了1个令牌
     
+    def test_check_returns_bucket_snapshot(self):
+        """测试 check 一次性返回是否允许及剩余令牌"""
+        limiter = RateLimiter(requests_per_minute=60, burst_size=2)
+
+        allowed, tokens, last_refill = limiter.check("snapshot_ip", now=100.0)
+        assert allowed is True
+        assert tokens == 1.0
+        assert last_refill == 100.0
+
+        assert limiter.check("snapshot_ip", now=100.0)[0] is True
+        allowed, tokens, _ = limiter.check("snapshot_ip", now=100.0)
+        assert allowed is False
+        assert tokens == 0.0
+
+        # 1秒后补充1个令牌
+        assert limiter.check("snapshot_ip", now=101.0) == (True, 0.0, 101.0)
+        assert limiter.check("snapshot_ip", now=101.0)[0] is False
+
     @pytest.mark.asyncio
     async def test_token_bucket_burst_handling(self):
         """测试突发流量处理"""
@@ -253,6 +271,28 @@ class TestIPBlockingFunctionality:
             assert middleware._is_ip_blocked("2.2.2.2") is True
             assert middleware._is_ip_blocked("3.3.3.3") is False
     
+    def test_ip_blocking_cidr_ranges(self):
+        """测试阻止列表中的CIDR网段"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            blocked_ips_file = Path(temp_dir) / "cidr_blocked.json"
+            with open(blocked_ips_file, 'w') as f:
+                json.dump(["1.1.1.1", "10.0.0.0/8", "192.168.1.0/24", "2001:db8::/32", "bad/cidr"], f)
+            
+            middleware = RateLimitMiddleware(
+                app=Mock(),
+                rate_limiter=RateLimiter(60, 5),
+                ip_block_enabled=True,
+                blocked_ips_file=str(blocked_ips_file)
+            )
+            
+            assert middleware._is_ip_blocked("1.1.1.1") is True
+            assert middleware._is_ip_blocked("10.255.0.1") is True
+            assert middleware._is_ip_blocked("192.168.1.77") is True
+            assert middleware._is_ip_blocked("192.168.2.1") is False
+            assert middleware._is_ip_blocked("2001:db8:1::5") is True
+            assert middleware._is_ip_blocked("2001:db9::1") is False
+            assert middleware._is_ip_blocked("unknown-client") is False
+    
     def test_ip_blocking_file_refresh(self):
         """测试IP阻止文件刷新"""
         with tempfile.TemporaryDirectory() as temp_dir:
@@ -287,6 +327,50 @@ class TestIPBlockingFunctionality:
             # 验证更新
             assert middleware._is_ip_blocked("2.2.2.2") is True
 
+    
+    def test_watch_task_follows_lifespan(self):
+        """测试阻止IP文件监听任务随 lifespan 启动，关闭时取消，请求路径上不再启动"""
+        async def awatch(*args, **kwargs):
+            await asyncio.Event().wait()
+            yield
+        
+        started_tasks = []
+        
+        async def inner_app(scope, receive, send):
+            await receive()
+            started_tasks.append(middleware._watch_task)
+            await send({"type": "lifespan.startup.complete"})
+            await receive()
+            await send({"type": "lifespan.shutdown.complete"})
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            blocked_ips_file = Path(temp_dir) / "blocked.json"
+            blocked_ips_file.write_text('["1.1.1.1"]')
+            middleware = RateLimitMiddleware(
+                app=inner_app,
+                rate_limiter=None,
+                enabled=False,
+                ip_block_enabled=True,
+                blocked_ips_file=str(blocked_ips_file)
+            )
+            messages = [{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}]
+            
+            async def receive():
+                return messages.pop(0)
+            
+            async def send(message):
+                pass
+            
+            async def run_lifespan():
+                await middleware({"type": "lifespan"}, receive, send)
+                await asyncio.sleep(0)
+            
+            with patch('app.middleware.rate_limiter.watchfiles', Mock(awatch=awatch)):
+                asyncio.run(run_lifespan())
+            
+            assert started_tasks[0] is not None
+            assert started_tasks[0].cancelled()
+            assert middleware._watch_task is None
 
 class TestRateLimitingWithRealRequests:
     """使用真实请求的限流测试"""
@@ -317,6 +401,25 @@ class TestRateLimitingWithRealRequests:
         # 由于中间件配置问题，我们主要检查请求不会崩溃
         assert all(status in [200, 429] for status in responses)
 
+    def test_rate_limit_rejection_returns_429(self):
+        """测试超出限流时中间件直接返回429响应（而不是抛出异常变成500）"""
+        from starlette.applications import Starlette
+        from starlette.responses import PlainTextResponse
+        from starlette.routing import Route
+
+        test_app = Starlette(routes=[Route("/", lambda request: PlainTextResponse("ok"))])
+        test_app.add_middleware(RateLimitMiddleware, rate_limiter=RateLimiter(60, 2), trust_proxy=False)
+        test_client = TestClient(test_app)
+
+        statuses = [test_client.get("/").status_code for _ in range(3)]
+        assert statuses == [200, 200, 429]
+
+        response = test_client.get("/")
+        assert response.status_code == 429
+        assert response.headers["Retry-After"] == "2"
+        assert response.headers["X-RateLimit-Remaining"] == "0"
+        assert response.json()["detail"]["retry_after"] == 2
+
 
 class TestRateLimitConfiguration:
     """限流配置测试"""
@@ -440,6 +543,34 @@ class TestRateLimitMemoryManagement:
         # 由于清理是异步的，我们只检查系统没有崩溃
         assert status_after["total_buckets"] >= 50
 
+    @pytest.mark.asyncio
+    async def test_lazy_eviction_and_lru_bound(self):
+        """测试访问时惰性淘汰过期bucket以及LRU数量上限"""
+        from app.middleware import rate_limiter as rate_limiter_module
+        limiter = RateLimiter(requests_per_minute=60, burst_size=2)
+
+        # 耗尽令牌后标记为长时间未活动，再次访问时应重建为满桶
+        for _ in range(2):
+            await limiter.is_allowed("idle_ip")
+        assert await limiter.is_allowed("idle_ip") is False
+        limiter.buckets["idle_ip"].last_refill = time.monotonic() - 700
+        assert await limiter.is_allowed("idle_ip") is True
+        assert limiter.buckets["idle_ip"].tokens == 1
+
+        # 头部连续的过期bucket在其他key访问时一次性移除
+        await limiter.is_allowed("other_ip")
+        await limiter.is_allowed("another_ip")
+        for key in ("idle_ip", "other_ip"):
+            limiter.buckets[key].last_refill = time.monotonic() - 700
+        await limiter.is_allowed("new_ip")
+        assert list(limiter.buckets) == ["another_ip", "new_ip"]
+
+        # 超出上限时淘汰最久未访问的bucket
+        with patch.object(rate_limiter_module, "MAX_BUCKETS", 3):
+            for ip in ("a", "b", "c", "d"):
+                await limiter.is_allowed(ip)
+        assert list(limiter.buckets) == ["b", "c", "d"]
+
 
 class TestRateLimitErrorHandling:
     """限流错误处理测试"""
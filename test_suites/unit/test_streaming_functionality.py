@@ -59,6 +59,8 @@ class TestStreamingDetection:
             b'{"stream":true}',  # 无空格
             b'{"other": "data", "stream": true}',
             b'  {"stream": true}  ',  # 带空格
+            b'{"stream" :\n  true}',  # 冒号两侧的换行和空格
+            b'{"metadata": {"note": "stream"}, "stream": true}',  # 前面出现同名字符串
         ]
         
         for body in streaming_bodies:
@@ -103,11 +105,11 @@ class TestStreamingRequestHandling:
         """测试流式请求处理（使用Mock）"""
         # 模拟流式响应
         mock_response = Mock()
-        async def mock_aiter_bytes():
+        async def mock_aiter_raw():
             for chunk in [b'data: {"chunk": 1}\n\n', b'data: {"chunk": 2}\n\n', b'data: [DONE]\n\n']:
                 yield chunk
         
-        mock_response.aiter_bytes = mock_aiter_bytes
+        mock_response.aiter_raw = mock_aiter_raw
         
         mock_stream.return_value.__aenter__.return_value = mock_response
         